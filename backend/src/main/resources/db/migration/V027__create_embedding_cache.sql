@@ -0,0 +1,9 @@
+-- Content-addressed cache of embeddings so identical texts are only sent to the
+-- embedding API once per model (keyed by SHA-256 of the input text)
+CREATE TABLE IF NOT EXISTS embedding_cache (
+  model TEXT NOT NULL,
+  text_sha BYTEA NOT NULL,
+  embedding vector NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (model, text_sha)
+);
@@ -0,0 +1,6 @@
+-- Canonical lowercased store so store filters can use a plain B-tree equality
+-- lookup instead of a per-row ILIKE pattern match
+ALTER TABLE items
+  ADD COLUMN IF NOT EXISTS store_norm TEXT GENERATED ALWAYS AS (lower(store)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_items_store_norm ON items(store_norm);
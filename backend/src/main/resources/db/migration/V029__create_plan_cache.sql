@@ -0,0 +1,18 @@
+-- Semantic cache of validated LLM meal plans. Entries are matched exactly on the
+-- fields that change the plan's validity (model, store, days, start date,
+-- allergies, candidate set) and by embedding distance on the remaining preferences
+CREATE TABLE IF NOT EXISTS plan_cache (
+  id BIGSERIAL PRIMARY KEY,
+  model TEXT NOT NULL,
+  store TEXT NOT NULL,
+  days INTEGER NOT NULL,
+  start_date DATE NOT NULL,
+  allergies TEXT NOT NULL DEFAULT '',
+  ids_hash TEXT NOT NULL,
+  embedding vector NOT NULL,
+  response_json TEXT NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_plan_cache_lookup
+  ON plan_cache(model, store, days, start_date, ids_hash);
@@ -0,0 +1,11 @@
+-- text-embedding-3 vectors are unit length, so ranking by inner product gives
+-- the same order as cosine distance while skipping the norm computation.
+-- Retrieval orders item_embeddings by <#> (negative inner product); rebuild
+-- its HNSW index with the matching operator class.
+CREATE INDEX IF NOT EXISTS idx_item_embeddings_hnsw_ip
+ON item_embeddings
+USING hnsw (embedding vector_ip_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- The cosine index is no longer used by any query on item_embeddings
+DROP INDEX IF EXISTS idx_item_embeddings_hnsw;
@@ -0,0 +1,89 @@
+-- Prompt-ready projections of the parsed nutrition/ingredients JSON, computed
+-- once on write so /generate does not re-parse the full blobs per request.
+-- The source columns are TEXT and may hold non-JSON raw text, so a trigger
+-- (not a generated column) fills these and leaves NULL when parsing fails.
+ALTER TABLE item_nutrition ADD COLUMN IF NOT EXISTS compact JSONB;
+ALTER TABLE item_ingredients ADD COLUMN IF NOT EXISTS compact JSONB;
+
+CREATE OR REPLACE FUNCTION item_nutrition_set_compact() RETURNS trigger AS $$
+DECLARE
+  doc JSONB;
+  parsed JSONB;
+BEGIN
+  NEW.compact := NULL;
+  BEGIN
+    doc := NEW.nutrition::jsonb;
+  EXCEPTION WHEN others THEN
+    RETURN NEW;
+  END;
+
+  parsed := CASE WHEN jsonb_typeof(doc) = 'object' THEN doc->'parsed' END;
+  IF jsonb_typeof(parsed) = 'object' THEN
+    NEW.compact := jsonb_build_object(
+      'serving_count', parsed->'serving_count',
+      'serving_size_text', parsed->'serving_size_text',
+      'serving_size_grams', parsed->'serving_size_grams',
+      'calories', parsed->'calories',
+      'protein_g', parsed->'protein_g',
+      'total_fat_g', parsed->'total_fat_g',
+      'total_carbohydrate_g', parsed->'total_carbohydrate_g',
+      'dietary_fiber_g', parsed->'dietary_fiber_g',
+      'total_sugars_g', parsed->'total_sugars_g',
+      'sodium_mg', parsed->'sodium_mg',
+      'cholesterol_mg', parsed->'cholesterol_mg',
+      'saturated_fat_g', parsed->'saturated_fat_g'
+    );
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION item_ingredients_set_compact() RETURNS trigger AS $$
+DECLARE
+  doc JSONB;
+  parsed JSONB;
+  names JSONB := '[]'::jsonb;
+BEGIN
+  NEW.compact := NULL;
+  BEGIN
+    doc := NEW.ingredients::jsonb;
+  EXCEPTION WHEN others THEN
+    RETURN NEW;
+  END;
+
+  parsed := CASE WHEN jsonb_typeof(doc) = 'object' THEN doc->'parsed' END;
+  IF jsonb_typeof(parsed) = 'object' THEN
+    -- First 30 named entries, capped to avoid prompt bloat
+    IF jsonb_typeof(parsed->'ingredients_list') = 'array' THEN
+      SELECT COALESCE(jsonb_agg(x->>'name' ORDER BY ord), '[]'::jsonb)
+      INTO names
+      FROM jsonb_array_elements(parsed->'ingredients_list') WITH ORDINALITY AS t(x, ord)
+      WHERE ord <= 30
+        AND jsonb_typeof(x) = 'object'
+        AND COALESCE(x->>'name', '') <> '';
+    END IF;
+
+    NEW.compact := jsonb_build_object(
+      'ingredients_raw', CASE WHEN COALESCE(parsed->>'ingredients_raw', '') <> ''
+                              THEN parsed->'ingredients_raw' ELSE doc->'raw' END,
+      'ingredients_names', names,
+      'ingredients_count', parsed->'ingredients_count'
+    );
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_item_nutrition_compact ON item_nutrition;
+CREATE TRIGGER trg_item_nutrition_compact
+  BEFORE INSERT OR UPDATE OF nutrition ON item_nutrition
+  FOR EACH ROW EXECUTE FUNCTION item_nutrition_set_compact();
+
+DROP TRIGGER IF EXISTS trg_item_ingredients_compact ON item_ingredients;
+CREATE TRIGGER trg_item_ingredients_compact
+  BEFORE INSERT OR UPDATE OF ingredients ON item_ingredients
+  FOR EACH ROW EXECUTE FUNCTION item_ingredients_set_compact();
+
+-- Populate existing rows
+UPDATE item_nutrition SET nutrition = nutrition;
+UPDATE item_ingredients SET ingredients = ingredients;
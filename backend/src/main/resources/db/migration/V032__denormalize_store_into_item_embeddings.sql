@@ -0,0 +1,46 @@
+-- Copy the item's normalized store onto its embedding row so the /generate
+-- store filter is evaluated on the table the HNSW index scans, instead of on
+-- a joined column, and so per-store partial HNSW indexes can be built.
+ALTER TABLE item_embeddings ADD COLUMN IF NOT EXISTS store_norm TEXT;
+
+UPDATE item_embeddings ie
+SET store_norm = i.store_norm
+FROM items i
+WHERE i.id = ie.item_id
+  AND ie.store_norm IS DISTINCT FROM i.store_norm;
+
+-- Keep it in sync on every embedding write (upserts, COPY merges, scripts)
+CREATE OR REPLACE FUNCTION item_embeddings_set_store_norm() RETURNS trigger AS $$
+BEGIN
+  SELECT store_norm INTO NEW.store_norm FROM items WHERE id = NEW.item_id;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_item_embeddings_store_norm ON item_embeddings;
+CREATE TRIGGER trg_item_embeddings_store_norm
+  BEFORE INSERT OR UPDATE OF item_id ON item_embeddings
+  FOR EACH ROW EXECUTE FUNCTION item_embeddings_set_store_norm();
+
+-- ...and when an item moves to another store
+CREATE OR REPLACE FUNCTION items_propagate_store_norm() RETURNS trigger AS $$
+BEGIN
+  UPDATE item_embeddings SET store_norm = NEW.store_norm WHERE item_id = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_items_store_norm ON items;
+CREATE TRIGGER trg_items_store_norm
+  AFTER UPDATE OF store ON items
+  FOR EACH ROW
+  WHEN (OLD.store IS DISTINCT FROM NEW.store)
+  EXECUTE FUNCTION items_propagate_store_norm();
+
+-- Partial HNSW index for the store that serves nearly all traffic: the graph
+-- only contains that store's vectors, so no candidates are filtered away
+CREATE INDEX IF NOT EXISTS idx_item_embeddings_hnsw_ip_trader_joes
+ON item_embeddings
+USING hnsw (embedding vector_ip_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE store_norm = 'trader_joes';
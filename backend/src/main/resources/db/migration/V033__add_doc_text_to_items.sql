@@ -0,0 +1,11 @@
+-- The text embedded for each item, built by Postgres on write so backfills
+-- select it directly instead of rebuilding it per row in Python
+ALTER TABLE items
+  ADD COLUMN IF NOT EXISTS doc_text TEXT GENERATED ALWAYS AS (
+    'name: ' || name
+    || E'\nstore: ' || store
+    || E'\ncategory: ' || COALESCE(category_path, '')
+    || E'\nunit: ' || COALESCE(unit_size, '')
+    || E'\nprice: ' || COALESCE(price::text, '')
+    || E'\ntags: ' || COALESCE(tags_json::text, '')
+  ) STORED;
@@ -0,0 +1,21 @@
+-- Store item embeddings as half precision (requires pgvector >= 0.7). This
+-- halves the bytes the HNSW scan reads per candidate; text-embedding-3 vectors
+-- lose no meaningful ranking precision at FP16.
+-- Indexes are tied to the vector operator class, so rebuild them around the
+-- type change.
+DROP INDEX IF EXISTS idx_item_embeddings_hnsw_ip;
+DROP INDEX IF EXISTS idx_item_embeddings_hnsw_ip_trader_joes;
+
+ALTER TABLE item_embeddings
+  ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);
+
+CREATE INDEX IF NOT EXISTS idx_item_embeddings_hnsw_ip
+ON item_embeddings
+USING hnsw (embedding halfvec_ip_ops)
+WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX IF NOT EXISTS idx_item_embeddings_hnsw_ip_trader_joes
+ON item_embeddings
+USING hnsw (embedding halfvec_ip_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE store_norm = 'trader_joes';
@@ -0,0 +1,18 @@
+-- Binary-quantized copy of each item embedding (1 bit per dimension) for a
+-- coarse Hamming-distance prefilter. The HNSW walk over bit(1536) reads 1/16th
+-- the bytes of the halfvec index; the RAG service reranks the shortlist with
+-- the full-precision vectors (see RETRIEVAL_BINARY_PREFILTER_K).
+ALTER TABLE item_embeddings
+  ADD COLUMN IF NOT EXISTS embedding_b bit(1536)
+  GENERATED ALWAYS AS (binary_quantize(embedding)::bit(1536)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_item_embeddings_hnsw_bit
+ON item_embeddings
+USING hnsw (embedding_b bit_hamming_ops)
+WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX IF NOT EXISTS idx_item_embeddings_hnsw_bit_trader_joes
+ON item_embeddings
+USING hnsw (embedding_b bit_hamming_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE store_norm = 'trader_joes';
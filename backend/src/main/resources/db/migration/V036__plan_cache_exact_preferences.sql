@@ -0,0 +1,13 @@
+-- Plan cache entries are now matched exactly on every preference. Dietary style
+-- and calorie target used to be compared by embedding distance, which could not
+-- tell e.g. 2000 from 2500 kcal apart, so existing entries are dropped
+TRUNCATE plan_cache;
+
+ALTER TABLE plan_cache
+  ADD COLUMN IF NOT EXISTS dietary_style TEXT NOT NULL DEFAULT '',
+  ADD COLUMN IF NOT EXISTS calories INTEGER,
+  DROP COLUMN IF EXISTS embedding;
+
+DROP INDEX IF EXISTS idx_plan_cache_lookup;
+CREATE INDEX IF NOT EXISTS idx_plan_cache_lookup
+  ON plan_cache(model, store, days, start_date, ids_hash, dietary_style, allergies);
@@ -0,0 +1,14 @@
+-- Rows submitted to the OpenAI Batch API for embedding, held until the batch is
+-- ingested (or ends unsuccessfully) so repeated backfill calls don't submit the
+-- same rows again. text_sha is the digest of the submitted text, used to fill
+-- embedding_cache when the results come back
+CREATE TABLE IF NOT EXISTS embedding_batch_items (
+  kind TEXT NOT NULL,
+  item_id BIGINT NOT NULL,
+  batch_id TEXT NOT NULL,
+  text_sha BYTEA NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (kind, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_batch_items_batch ON embedding_batch_items(batch_id);
@@ -4,7 +4,66 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 RAG_SHARED_SECRET = os.getenv("RAG_SHARED_SECRET", "")
 
+# Connections kept open by the process-wide pool (per worker). Size the total across
+# workers against the database host's capacity, not the API host's.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+# Executions before psycopg server-prepares a statement. Set to "off" when connecting
+# through PgBouncer in transaction mode, which cannot keep prepared statements.
+_prepare_threshold = os.getenv("DB_PREPARE_THRESHOLD", "0")
+DB_PREPARE_THRESHOLD = None if _prepare_threshold.lower() == "off" else int(_prepare_threshold)
+
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
 CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4.1-mini")
 
+# OpenAI client retries (429/5xx/connection errors, with backoff) and per-operation
+# timeouts in seconds; the read timeout applies between streamed chunks, not in total
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "30"))
+OPENAI_CONNECT_TIMEOUT_S = float(os.getenv("OPENAI_CONNECT_TIMEOUT_S", "5"))
+
 RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "120"))
+# Only the closest candidates (retrieval is ordered by distance) are sent to the LLM
+MAX_ITEMS_TO_LLM = int(os.getenv("MAX_ITEMS_TO_LLM", "60"))
+
+# OpenAI caps embedding requests at 2048 inputs; keep each request under a token budget too
+# Single inputs over the model's context (8191 tokens for text-embedding-3) are truncated
+EMBED_MAX_INPUT_TOKENS = int(os.getenv("EMBED_MAX_INPUT_TOKENS", "8191"))
+EMBED_MAX_TOKENS_PER_REQUEST = int(os.getenv("EMBED_MAX_TOKENS_PER_REQUEST", "7500"))
+EMBED_MAX_INPUTS_PER_REQUEST = int(os.getenv("EMBED_MAX_INPUTS_PER_REQUEST", "2048"))
+
+# Embedding upserts at least this large are staged with binary COPY instead of executemany
+EMBED_COPY_THRESHOLD = int(os.getenv("EMBED_COPY_THRESHOLD", "500"))
+
+# In-process LRU in front of the embedding_cache table
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+
+# Concurrent query embeddings arriving within this window are sent as one request
+EMBED_BATCH_WINDOW_MS = int(os.getenv("EMBED_BATCH_WINDOW_MS", "20"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "64"))
+
+# Synchronous backfills embed and upsert in chunks of this many rows, overlapping the stages
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "128"))
+
+# Backfills that fetch more rows than this are routed through the OpenAI Batch API (cheaper, asynchronous)
+EMBED_BATCH_API_THRESHOLD = int(os.getenv("EMBED_BATCH_API_THRESHOLD", "1000"))
+
+# HNSW search breadth for retrieval; raised to at least the requested K since
+# an HNSW scan never returns more than ef_search rows
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "80"))
+# When > 0, retrieval first shortlists this many items by Hamming distance on the
+# binary-quantized embeddings, then reranks them in-process by inner product.
+# 0 ranks directly on the halfvec HNSW index.
+RETRIEVAL_BINARY_PREFILTER_K = int(os.getenv("RETRIEVAL_BINARY_PREFILTER_K", "0"))
+# Disable sequential scans for the retrieval transaction so the planner cannot flip
+# from the HNSW index to an exact seqscan when its row estimate for a store wobbles
+HNSW_FORCE_INDEX = os.getenv("HNSW_FORCE_INDEX", "true").lower() in ("1", "true", "yes")
+# Upper bound on tuples visited by pgvector's iterative index scan when the store filter discards rows
+HNSW_MAX_SCAN_TUPLES = int(os.getenv("HNSW_MAX_SCAN_TUPLES", "20000"))
+
+# In-process cache of full /generate responses, keyed exactly on store/days/date and
+# preferences (LRU, this many entries). 0 disables it.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+# Reuse a validated meal plan for a request with the same store/days/date, preferences and candidates
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
@@ -1,44 +1,51 @@
 import logging
-from contextlib import contextmanager
-from psycopg_pool import ConnectionPool
+from contextlib import asynccontextmanager
+from psycopg_pool import AsyncConnectionPool
 from psycopg.rows import dict_row
-from pgvector.psycopg import register_vector
+from pgvector.psycopg import register_vector_async
 
-from .config import DATABASE_URL
+from .config import DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_PREPARE_THRESHOLD
 
 logger = logging.getLogger(__name__)
 
-_pool: ConnectionPool | None = None
+_pool: AsyncConnectionPool | None = None
 
 
-def init_pool():
+async def init_pool():
     global _pool
     if not DATABASE_URL:
         logger.error("DATABASE_URL is not set")
         raise RuntimeError("DATABASE_URL is not set")
 
-    _pool = ConnectionPool(
+    _pool = AsyncConnectionPool(
         DATABASE_URL,
-        min_size=2,
-        max_size=10,
-        kwargs={"row_factory": dict_row},
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        # prepare_threshold=0 (the default) server-prepares every statement on first
+        # use, so the hot retrieval/verify queries skip parse+plan on later executions
+        kwargs={"row_factory": dict_row, "prepare_threshold": DB_PREPARE_THRESHOLD},
+        # pgvector types only need registering once per physical connection
+        configure=register_vector_async,
+        open=False,
     )
+    # Block startup until min_size connections are up, so the first requests
+    # never pay the connect/auth handshake
+    await _pool.open(wait=True)
     logger.info("Database connection pool initialized")
 
 
-def close_pool():
+async def close_pool():
     global _pool
     if _pool:
-        _pool.close()
+        await _pool.close()
         _pool = None
         logger.info("Database connection pool closed")
 
 
-@contextmanager
-def get_conn():
+@asynccontextmanager
+async def get_conn():
     if _pool is None:
-        init_pool()
+        await init_pool()
 
-    with _pool.connection() as conn:
-        register_vector(conn)
+    async with _pool.connection() as conn:
         yield conn
@@ -0,0 +1,50 @@
+"""
+Request sizing for the embeddings API, shared by embedding.py and
+scripts/backfill_item_embeddings.py. Limits are passed in rather than read
+from config so the script can import this module without the service's
+settings or clients.
+"""
+from typing import List, Tuple
+
+import tiktoken
+
+
+def truncate_texts(
+    encoder: tiktoken.Encoding, texts: List[str], max_input_tokens: int
+) -> Tuple[List[str], List[int]]:
+    """
+    Cut texts to max_input_tokens; returns the texts and their token counts.
+    OpenAI rejects (rather than truncates) over-long inputs, failing the whole
+    request, so they are cut to the model's context up front.
+    """
+    out: List[str] = []
+    counts: List[int] = []
+    for text, tokens in zip(texts, encoder.encode_batch(texts)):
+        if len(tokens) > max_input_tokens:
+            tokens = tokens[:max_input_tokens]
+            text = encoder.decode(tokens)
+        out.append(text)
+        counts.append(len(tokens))
+    return out, counts
+
+
+def pack_batches(token_counts: List[int], max_inputs: int, max_tokens: int) -> List[List[int]]:
+    """
+    Greedily group text indexes into request-sized batches that stay under
+    the per-request token budget and input count.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for idx, n_tokens in enumerate(token_counts):
+        if current and (
+            current_tokens + n_tokens > max_tokens
+            or len(current) >= max_inputs
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(idx)
+        current_tokens += n_tokens
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,87 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .db import get_conn
+from .config import EMBED_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+_lru: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def _lru_get(key: Tuple[str, bytes]) -> np.ndarray | None:
+    with _lru_lock:
+        vec = _lru.get(key)
+        if vec is not None:
+            _lru.move_to_end(key)
+        return vec
+
+
+def _lru_put(key: Tuple[str, bytes], vec: np.ndarray) -> None:
+    # Cached vectors are handed to many callers; make sure none can mutate them
+    vec.flags.writeable = False
+    with _lru_lock:
+        _lru[key] = vec
+        _lru.move_to_end(key)
+        while len(_lru) > EMBED_CACHE_SIZE:
+            _lru.popitem(last=False)
+
+
+def peek_cached_embedding(model: str, digest: bytes) -> np.ndarray | None:
+    """In-process LRU lookup only; never touches the database."""
+    return _lru_get((model, digest))
+
+
+async def get_cached_embeddings(model: str, digests: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+    """
+    Look up embeddings by text digest, first in the in-process LRU and then
+    in the embedding_cache table. Returns only the digests that were found.
+    """
+    found: Dict[bytes, np.ndarray] = {}
+    db_misses: List[bytes] = []
+    for digest in digests:
+        vec = _lru_get((model, digest))
+        if vec is not None:
+            found[digest] = vec
+        else:
+            db_misses.append(digest)
+
+    if db_misses:
+        async with get_conn() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                  SELECT text_sha, embedding
+                  FROM embedding_cache
+                  WHERE model = %s AND text_sha = ANY(%s::bytea[])
+                """, (model, db_misses), binary=True)
+                rows = await cur.fetchall()
+        for r in rows:
+            digest = bytes(r["text_sha"])
+            # Binary vectors decode big-endian; store native float32 for the hot dot products
+            vec = np.asarray(r["embedding"], dtype=np.float32)
+            found[digest] = vec
+            _lru_put((model, digest), vec)
+
+    logger.debug("Embedding cache: %d/%d hits", len(found), len(digests))
+    return found
+
+
+async def store_embeddings(model: str, entries: Sequence[Tuple[bytes, np.ndarray]]) -> None:
+    """Persist freshly computed embeddings keyed by text digest."""
+    if not entries:
+        return
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany("""
+              INSERT INTO embedding_cache (model, text_sha, embedding)
+              VALUES (%s, %s, %b)
+              ON CONFLICT (model, text_sha) DO NOTHING
+            """, [(model, digest, vec) for digest, vec in entries])
+        await conn.commit()
+    for digest, vec in entries:
+        _lru_put((model, digest), vec)
@@ -1,22 +1,67 @@
-import json
+import asyncio
+import base64
+import hashlib
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Set, Tuple
 
-from openai import OpenAI
-from .config import OPENAI_API_KEY, EMBED_MODEL
+import numpy as np
+import orjson
+import tiktoken
+from .openai_client import aclient
+from .embed_batching import pack_batches, truncate_texts
+from .embed_cache import get_cached_embeddings, peek_cached_embedding, store_embeddings
+from .config import (
+    EMBED_MODEL,
+    EMBED_MAX_TOKENS_PER_REQUEST,
+    EMBED_MAX_INPUTS_PER_REQUEST,
+    EMBED_MAX_INPUT_TOKENS,
+    EMBED_BATCH_WINDOW_MS,
+    EMBED_BATCH_MAX,
+)
 
 logger = logging.getLogger(__name__)
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-def item_doc(i: Dict[str, Any]) -> str:
-    return "\n".join([
-        f"name: {i.get('name','')}",
-        f"store: {i.get('store','')}",
-        f"category: {i.get('category_path','')}",
-        f"unit: {i.get('unit_size','')}",
-        f"price: {i.get('price','')}",
-        f"tags: {json.dumps(i.get('tags_json')) if i.get('tags_json') is not None else ''}",
-    ])
+
+_encoder: tiktoken.Encoding | None = None
+_MAX_CONCURRENT_REQUESTS = 8
+
+# (key, template) pairs rendered by nutrition_doc, in label order. Serving
+# fields are skipped when falsy; nutrient amounts only when missing.
+_NUT_SERVING_FIELDS = (
+    ("serving_count", "  Serves: {}"),
+    ("serving_size_text", "  Serving size: {}"),
+    ("serving_size_grams", "  Serving size (grams): {}"),
+)
+_NUT_FIELDS = (
+    ("calories", "  Calories: {} per serving"),
+    ("total_fat_g", "  Total fat: {}g"),
+    ("saturated_fat_g", "  Saturated fat: {}g"),
+    ("trans_fat_g", "  Trans fat: {}g"),
+    ("cholesterol_mg", "  Cholesterol: {}mg"),
+    ("sodium_mg", "  Sodium: {}mg"),
+    ("total_carbohydrate_g", "  Total carbohydrate: {}g"),
+    ("dietary_fiber_g", "  Dietary fiber: {}g"),
+    ("total_sugars_g", "  Total sugars: {}g"),
+    ("added_sugars_g", "  Added sugars: {}g"),
+    ("protein_g", "  Protein: {}g"),
+    ("vitamin_d_mcg", "  Vitamin D: {}mcg"),
+    ("calcium_mg", "  Calcium: {}mg"),
+    ("iron_mg", "  Iron: {}mg"),
+    ("potassium_mg", "  Potassium: {}mg"),
+)
+
+def _parsed_json(row: Dict[str, Any], field: str) -> Any:
+    """
+    Parse row[field] as JSON once and memoize the result on the row, so every
+    doc builder that touches the same fetched row shares a single parse.
+    Returns None if the field is not valid JSON.
+    """
+    key = f"_{field}_parsed"
+    if key not in row:
+        try:
+            row[key] = orjson.loads(row.get(field, ''))
+        except (orjson.JSONDecodeError, TypeError):
+            row[key] = None
+    return row[key]
 
 def nutrition_doc(nutrition_data: Dict[str, Any]) -> str:
     """
@@ -28,61 +73,21 @@ def nutrition_doc(nutrition_data: Dict[str, Any]) -> str:
     # Check if nutrition is stored as JSON string (parsed format)
     nutrition_text = nutrition_data.get('nutrition', '')
     if isinstance(nutrition_text, str):
-        try:
-            # Try to parse as JSON
-            nutrition_json = json.loads(nutrition_text)
-            if isinstance(nutrition_json, dict) and 'parsed' in nutrition_json:
-                # Use parsed data
-                parsed = nutrition_json.get('parsed', {})
-                if parsed:
-                    parts.append("Nutrition Facts:")
-                    if parsed.get('serving_count'):
-                        parts.append(f"  Serves: {parsed['serving_count']}")
-                    if parsed.get('serving_size_text'):
-                        parts.append(f"  Serving size: {parsed['serving_size_text']}")
-                    if parsed.get('serving_size_grams'):
-                        parts.append(f"  Serving size (grams): {parsed['serving_size_grams']}")
-                    if parsed.get('calories') is not None:
-                        parts.append(f"  Calories: {parsed['calories']} per serving")
-                    if parsed.get('total_fat_g') is not None:
-                        parts.append(f"  Total fat: {parsed['total_fat_g']}g")
-                    if parsed.get('saturated_fat_g') is not None:
-                        parts.append(f"  Saturated fat: {parsed['saturated_fat_g']}g")
-                    if parsed.get('trans_fat_g') is not None:
-                        parts.append(f"  Trans fat: {parsed['trans_fat_g']}g")
-                    if parsed.get('cholesterol_mg') is not None:
-                        parts.append(f"  Cholesterol: {parsed['cholesterol_mg']}mg")
-                    if parsed.get('sodium_mg') is not None:
-                        parts.append(f"  Sodium: {parsed['sodium_mg']}mg")
-                    if parsed.get('total_carbohydrate_g') is not None:
-                        parts.append(f"  Total carbohydrate: {parsed['total_carbohydrate_g']}g")
-                    if parsed.get('dietary_fiber_g') is not None:
-                        parts.append(f"  Dietary fiber: {parsed['dietary_fiber_g']}g")
-                    if parsed.get('total_sugars_g') is not None:
-                        parts.append(f"  Total sugars: {parsed['total_sugars_g']}g")
-                    if parsed.get('added_sugars_g') is not None:
-                        parts.append(f"  Added sugars: {parsed['added_sugars_g']}g")
-                    if parsed.get('protein_g') is not None:
-                        parts.append(f"  Protein: {parsed['protein_g']}g")
-                    if parsed.get('vitamin_d_mcg') is not None:
-                        parts.append(f"  Vitamin D: {parsed['vitamin_d_mcg']}mcg")
-                    if parsed.get('calcium_mg') is not None:
-                        parts.append(f"  Calcium: {parsed['calcium_mg']}mg")
-                    if parsed.get('iron_mg') is not None:
-                        parts.append(f"  Iron: {parsed['iron_mg']}mg")
-                    if parsed.get('potassium_mg') is not None:
-                        parts.append(f"  Potassium: {parsed['potassium_mg']}mg")
-                # Fall back to raw if parsed is empty
-                if not parts or len(parts) == 1:
-                    raw_text = nutrition_json.get('raw', '')
-                    if raw_text:
-                        parts = [f"Nutrition: {raw_text[:1000]}"]  # Limit length
-            else:
-                # Not in expected format, use as-is (raw text)
-                if nutrition_text:
-                    parts.append(f"Nutrition: {nutrition_text[:1000]}")
-        except (json.JSONDecodeError, TypeError):
-            # Not JSON, treat as raw text
+        nutrition_json = _parsed_json(nutrition_data, 'nutrition')
+        if isinstance(nutrition_json, dict) and 'parsed' in nutrition_json:
+            # Use parsed data
+            parsed = nutrition_json.get('parsed', {})
+            if parsed:
+                parts.append("Nutrition Facts:")
+                parts.extend(t.format(v) for k, t in _NUT_SERVING_FIELDS if (v := parsed.get(k)))
+                parts.extend(t.format(v) for k, t in _NUT_FIELDS if (v := parsed.get(k)) is not None)
+            # Fall back to raw if parsed is empty
+            if not parts or len(parts) == 1:
+                raw_text = nutrition_json.get('raw', '')
+                if raw_text:
+                    parts = [f"Nutrition: {raw_text[:1000]}"]  # Limit length
+        else:
+            # Not in expected format, use as-is (raw text)
             if nutrition_text:
                 parts.append(f"Nutrition: {nutrition_text[:1000]}")
     
@@ -98,66 +103,228 @@ def ingredients_doc(ingredients_data: Dict[str, Any]) -> str:
     # Check if ingredients is stored as JSON string (parsed format)
     ingredients_text = ingredients_data.get('ingredients', '')
     if isinstance(ingredients_text, str):
-        try:
-            # Try to parse as JSON
-            ingredients_json = json.loads(ingredients_text)
-            if isinstance(ingredients_json, dict) and 'parsed' in ingredients_json:
-                # Use parsed data
-                parsed = ingredients_json.get('parsed', {})
-                if parsed:
-                    parts.append("Ingredients:")
-                    ingredients_list = parsed.get('ingredients_list', [])
-                    if ingredients_list:
-                        # Extract main ingredients (not sub-ingredients)
-                        main_ingredients = [
-                            ing.get('name', '') 
-                            for ing in ingredients_list 
-                            if not ing.get('is_sub_ingredient', False)
-                        ]
-                        if main_ingredients:
-                            parts.append(f"  Main ingredients: {', '.join(main_ingredients)}")
-                        
-                        # Include sub-ingredients with context
-                        sub_ingredients = [
-                            ing for ing in ingredients_list 
-                            if ing.get('is_sub_ingredient', False)
-                        ]
-                        if sub_ingredients:
-                            for sub in sub_ingredients:
-                                parent = sub.get('parent', '')
-                                name = sub.get('name', '')
-                                if parent and name:
-                                    parts.append(f"  {parent} contains: {name}")
-                    
-                    # Include "contains less than" information
-                    contains_less_than = parsed.get('contains_less_than', [])
-                    if contains_less_than:
-                        for ct in contains_less_than:
-                            percentage = ct.get('percentage', 0)
-                            ing_list = ct.get('ingredients', [])
-                            ing_names = [ing.get('name', '') for ing in ing_list if ing.get('name')]
-                            if ing_names:
-                                parts.append(f"  Contains {percentage}% or less of: {', '.join(ing_names)}")
+        ingredients_json = _parsed_json(ingredients_data, 'ingredients')
+        if isinstance(ingredients_json, dict) and 'parsed' in ingredients_json:
+            # Use parsed data
+            parsed = ingredients_json.get('parsed', {})
+            if parsed:
+                parts.append("Ingredients:")
+                ingredients_list = parsed.get('ingredients_list', [])
+                if ingredients_list:
+                    # Extract main ingredients (not sub-ingredients)
+                    main_ingredients = [
+                        ing.get('name', '') 
+                        for ing in ingredients_list 
+                        if not ing.get('is_sub_ingredient', False)
+                    ]
+                    if main_ingredients:
+                        parts.append(f"  Main ingredients: {', '.join(main_ingredients)}")
                     
-                    # Fall back to raw if parsed is empty
-                    if not parts or len(parts) == 1:
-                        raw_text = ingredients_json.get('raw', '')
-                        if raw_text:
-                            parts = [f"Ingredients: {raw_text[:1000]}"]  # Limit length
-            else:
-                # Not in expected format, use as-is (raw text)
-                if ingredients_text:
-                    parts.append(f"Ingredients: {ingredients_text[:1000]}")
-        except (json.JSONDecodeError, TypeError):
-            # Not JSON, treat as raw text
+                    # Include sub-ingredients with context
+                    sub_ingredients = [
+                        ing for ing in ingredients_list 
+                        if ing.get('is_sub_ingredient', False)
+                    ]
+                    if sub_ingredients:
+                        for sub in sub_ingredients:
+                            parent = sub.get('parent', '')
+                            name = sub.get('name', '')
+                            if parent and name:
+                                parts.append(f"  {parent} contains: {name}")
+                
+                # Include "contains less than" information
+                contains_less_than = parsed.get('contains_less_than', [])
+                if contains_less_than:
+                    for ct in contains_less_than:
+                        percentage = ct.get('percentage', 0)
+                        ing_list = ct.get('ingredients', [])
+                        ing_names = [ing.get('name', '') for ing in ing_list if ing.get('name')]
+                        if ing_names:
+                            parts.append(f"  Contains {percentage}% or less of: {', '.join(ing_names)}")
+                
+                # Fall back to raw if parsed is empty
+                if not parts or len(parts) == 1:
+                    raw_text = ingredients_json.get('raw', '')
+                    if raw_text:
+                        parts = [f"Ingredients: {raw_text[:1000]}"]  # Limit length
+        else:
+            # Not in expected format, use as-is (raw text)
             if ingredients_text:
                 parts.append(f"Ingredients: {ingredients_text[:1000]}")
     
     return "\n".join(parts) if parts else ""
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
-    return [d.embedding for d in resp.data]
+def _get_encoder() -> tiktoken.Encoding:
+    global _encoder
+    if _encoder is None:
+        try:
+            _encoder = tiktoken.encoding_for_model(EMBED_MODEL)
+        except KeyError:
+            _encoder = tiktoken.get_encoding("cl100k_base")
+    return _encoder
+
+def _decode_embedding(b64: str) -> np.ndarray:
+    """Little-endian float32 buffer from encoding_format="base64" -> float32 vector."""
+    return np.frombuffer(base64.b64decode(b64), dtype="<f4")
+
+async def _embed_batch(texts: List[str]) -> np.ndarray:
+    # With an explicit base64 format the SDK hands back the raw buffer instead
+    # of decoding it into a list of Python floats (1536 objects per vector)
+    resp = await aclient.embeddings.create(model=EMBED_MODEL, input=texts, encoding_format="base64")
+    return np.stack([_decode_embedding(d.embedding) for d in resp.data])
+
+async def _embed_uncached(texts: List[str]) -> np.ndarray:
+    texts, token_counts = truncate_texts(_get_encoder(), texts, EMBED_MAX_INPUT_TOKENS)
+    batches = pack_batches(token_counts, EMBED_MAX_INPUTS_PER_REQUEST, EMBED_MAX_TOKENS_PER_REQUEST)
+    if len(batches) == 1:
+        return await _embed_batch(texts)
+
+    logger.info("Embedding %d texts in %d concurrent requests", len(texts), len(batches))
+    sem = asyncio.Semaphore(_MAX_CONCURRENT_REQUESTS)
+
+    async def run(batch: List[int]) -> np.ndarray:
+        async with sem:
+            return await _embed_batch([texts[i] for i in batch])
+
+    results = await asyncio.gather(*(run(batch) for batch in batches))
+
+    # Stitch batch outputs back into input order
+    vectors = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+    for batch, batch_vectors in zip(batches, results):
+        vectors[batch] = batch_vectors
+    return vectors
+
+def text_digest(text: str) -> bytes:
+    """Key of a text in the embedding cache."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+async def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts, serving repeats from the embedding cache and only sending
+    cache misses to OpenAI. Returns a (len(texts), dim) float32 array.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+
+    digests = [text_digest(t) for t in texts]
+    # Duplicate texts share a digest: look up and embed each one once, then
+    # scatter the vector back to every position it appeared in
+    index_by_digest = dict(zip(digests, range(len(texts))))
+    cached = await get_cached_embeddings(EMBED_MODEL, list(index_by_digest))
+
+    misses = [i for d, i in index_by_digest.items() if d not in cached]
+    if misses:
+        fresh = await _embed_uncached([texts[i] for i in misses])
+        entries = [(digests[i], vec) for i, vec in zip(misses, fresh)]
+        await store_embeddings(EMBED_MODEL, entries)
+        cached.update(entries)
+
+    return np.stack([cached[d] for d in digests])
+
+async def embed_one(text: str) -> np.ndarray:
+    return (await embed_texts([text]))[0]
+
+class EmbedBatcher:
+    """
+    Coalesces single-text embeddings requested concurrently (one per /generate
+    call) into one embed_texts call per short window, so N concurrent queries
+    cost one OpenAI request instead of N.
+    """
+
+    def __init__(self, window_ms: int = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_BATCH_MAX):
+        self._window = window_ms / 1000
+        self._max_batch = max_batch
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> np.ndarray:
+        # /generate query texts are a template over a handful of preferences, so
+        # repeats are common; serve LRU hits without waiting out the window
+        cached = peek_cached_embedding(EMBED_MODEL, text_digest(text))
+        if cached is not None:
+            return cached
+        if self._window <= 0:
+            return await embed_one(text)
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self._max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.create_task(self._run(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            vectors = await embed_texts([text for text, _ in pending])
+        except Exception as e:
+            for _, fut in pending:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), vec in zip(pending, vectors):
+            if not fut.done():
+                fut.set_result(vec)
+
+embed_batcher = EmbedBatcher()
+
+async def submit_batch_embeddings(texts: List[str], custom_ids: List[str], metadata: Dict[str, str]) -> str:
+    """
+    Submit texts to the OpenAI Batch API (24h window, ~50% cheaper than the
+    interactive endpoint). Each line's custom_id is echoed back in the results.
+    Returns the batch id.
+    """
+    lines = [
+        orjson.dumps({
+            "custom_id": cid,
+            "method": "POST",
+            "url": "/v1/embeddings",
+            "body": {"model": EMBED_MODEL, "input": text, "encoding_format": "base64"},
+        })
+        for cid, text in zip(custom_ids, texts)
+    ]
+    batch_file = await aclient.files.create(
+        file=("embeddings.jsonl", b"\n".join(lines)),
+        purpose="batch",
+    )
+    batch = await aclient.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/embeddings",
+        completion_window="24h",
+        metadata=metadata,
+    )
+    logger.info("Submitted embedding batch %s with %d inputs", batch.id, len(texts))
+    return batch.id
+
+async def fetch_batch_embeddings(batch_id: str) -> Tuple[Any, Dict[str, np.ndarray]]:
+    """
+    Fetch a batch and, once it has completed, its embeddings keyed by custom_id.
+    Failed lines are left out of the result.
+    """
+    batch = await aclient.batches.retrieve(batch_id)
+    if batch.status != "completed" or not batch.output_file_id:
+        return batch, {}
 
-def embed_one(text: str) -> List[float]:
-    return embed_texts([text])[0]
+    output = await aclient.files.content(batch.output_file_id)
+    vectors: Dict[str, np.ndarray] = {}
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        result = orjson.loads(line)
+        response = result.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        vectors[result["custom_id"]] = _decode_embedding(response["body"]["data"][0]["embedding"])
+    return batch, vectors
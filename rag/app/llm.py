@@ -1,12 +1,63 @@
-import json
 import logging
-from openai import OpenAI
-from .config import OPENAI_API_KEY, CHAT_MODEL
+from typing import AsyncIterator, List
+
+import orjson
+from .openai_client import aclient
+from .config import CHAT_MODEL
 
 logger = logging.getLogger(__name__)
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-def call_mealplan_llm(system: str, user_payload: dict, temperature: float = 0.4) -> str:
+# Structured Outputs schema mirroring validators.MealPlanDoc. With strict mode the
+# model can only emit this shape, so malformed plans (missing fields, unknown meal
+# names) no longer surface as 500s from validation. Length limits are still
+# enforced by MealPlanDoc.
+_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {"id": {"type": "integer"}, "name": {"type": "string"}},
+    "required": ["id", "name"],
+    "additionalProperties": False,
+}
+
+_MEAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "enum": ["Breakfast", "Lunch", "Dinner"]},
+        "items": {"type": "array", "items": _ITEM_SCHEMA},
+    },
+    "required": ["name", "items"],
+    "additionalProperties": False,
+}
+
+_DAY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "date": {"type": "string"},
+        "meals": {"type": "array", "items": _MEAL_SCHEMA},
+    },
+    "required": ["date", "meals"],
+    "additionalProperties": False,
+}
+
+MEAL_PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "meal_plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "startDate": {"type": "string"},
+                "endDate": {"type": "string"},
+                "plan": {"type": "array", "items": _DAY_SCHEMA},
+            },
+            "required": ["title", "startDate", "endDate", "plan"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+def _build_messages(system: str, user_payload: dict) -> List[dict]:
     # Build user message with dietary constraints
     user_message = "Return ONLY valid JSON with this shape:\n"
     user_message += "{title, startDate, endDate, plan:[{date, meals:[{name, items:[{id,name}]}]}]}\n"
@@ -24,24 +75,38 @@ def call_mealplan_llm(system: str, user_payload: dict, temperature: float = 0.4)
         else:
             user_message += f"\nImportant: Follow {dietary_style_formatted} dietary requirements. Only select items from the provided list that comply with this diet. Include meals (Breakfast, Lunch, Dinner) only when you have suitable items.\n"
     
-    messages = [
+    return [
         {"role": "system", "content": system},
         {"role": "user", "content": user_message},
-        {"role": "user", "content": json.dumps(user_payload)}
+        {"role": "user", "content": orjson.dumps(user_payload).decode()}
     ]
-    
+
+async def stream_mealplan_llm(system: str, user_payload: dict, temperature: float = 0.4) -> AsyncIterator[str]:
+    """
+    Stream the meal plan completion as content deltas. Structured Outputs
+    guarantee the concatenated output is a JSON object matching the plan schema.
+    """
+    messages = _build_messages(system, user_payload)
+
     # Log the complete input to OpenAI API
     logger.info("OpenAI API call - Model: %s, Temperature: %s", CHAT_MODEL, temperature)
-    #logger.info("OpenAI API call - Messages: %s", json.dumps(messages, indent=2, ensure_ascii=False))
-    
-    completion = client.chat.completions.create(
+    #logger.info("OpenAI API call - Messages: %s", orjson.dumps(messages, option=orjson.OPT_INDENT_2).decode())
+
+    stream = await aclient.chat.completions.create(
         model=CHAT_MODEL,
         messages=messages,
-        temperature=temperature
+        temperature=temperature,
+        response_format=MEAL_PLAN_RESPONSE_FORMAT,
+        stream=True,
     )
-    
-    response_content = completion.choices[0].message.content or ""
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def call_mealplan_llm(system: str, user_payload: dict, temperature: float = 0.4) -> str:
+    response_content = "".join([delta async for delta in stream_mealplan_llm(system, user_payload, temperature)])
     logger.info("OpenAI API response - Length: %d characters", len(response_content))
-    logger.info("OpenAI API response - Content: %s", response_content)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("OpenAI API response - Content: %s", response_content)
     
     return response_content
@@ -14,9 +14,9 @@ logging.basicConfig(level=logging.INFO)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_pool()
+    await init_pool()
     yield
-    close_pool()
+    await close_pool()
 
 
 app = FastAPI(title="MealGen RAG Service", lifespan=lifespan)
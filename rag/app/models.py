@@ -11,6 +11,9 @@ class GenerateRequest(BaseModel):
     store: str
     days: int
     preferences: Preferences
+    # False sends only item names/categories to the LLM (no nutrition/ingredients),
+    # roughly halving prompt tokens at the cost of calorie-aware selection
+    detailed: bool = True
 
 class GenerateResponse(BaseModel):
     title: str
@@ -25,3 +28,5 @@ class BackfillRequest(BaseModel):
 class BackfillResponse(BaseModel):
     updated: int
     skipped: int
+    batchId: Optional[str] = None
+    batchStatus: Optional[str] = None
@@ -0,0 +1,17 @@
+import httpx
+from openai import AsyncOpenAI
+
+from .config import OPENAI_API_KEY, OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_S, OPENAI_CONNECT_TIMEOUT_S
+
+# One process-wide pool of keep-alive HTTP/2 connections to the OpenAI API, so
+# embedding and chat calls reuse TLS sessions and multiplex streams under load
+_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_TIMEOUT = httpx.Timeout(OPENAI_TIMEOUT_S, connect=OPENAI_CONNECT_TIMEOUT_S)
+
+# Transient 429/5xx failures are retried with backoff instead of failing a whole batch
+aclient = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    max_retries=OPENAI_MAX_RETRIES,
+    timeout=_TIMEOUT,
+    http_client=httpx.AsyncClient(http2=True, limits=_LIMITS, timeout=_TIMEOUT),
+)
@@ -0,0 +1,71 @@
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from .db import get_conn
+from .config import CHAT_MODEL, PLAN_CACHE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_key(user_payload: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Fields a cached plan must match exactly. Every preference is compared
+    exactly: dietary style and calorie target are single values, and an
+    embedding distance cannot tell e.g. 2000 from 2500 kcal apart.
+    """
+    prefs = user_payload.get("preferences") or {}
+    ids = sorted(int(it["id"]) for it in user_payload.get("items", []))
+    ids_hash = hashlib.blake2b(
+        b",".join(str(i).encode() for i in ids), digest_size=8
+    ).hexdigest()
+    calories = prefs.get("targetCaloriesPerDay")
+    return (
+        CHAT_MODEL,
+        str(user_payload.get("store", "")).lower(),
+        int(user_payload.get("days", 0)),
+        user_payload.get("startDate"),
+        (prefs.get("dietaryRestrictions") or "").strip().lower(),
+        (prefs.get("allergies") or "").strip().lower(),
+        int(calories) if calories is not None else None,
+        ids_hash,
+    )
+
+
+async def lookup_cached_plan(user_payload: Dict[str, Any]) -> Optional[str]:
+    """Return a previously validated LLM response for an identical request, if any."""
+    if not PLAN_CACHE_ENABLED:
+        return None
+
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+              SELECT response_json
+              FROM plan_cache
+              WHERE model = %s AND store = %s AND days = %s AND start_date = %s
+                AND dietary_style = %s AND allergies = %s
+                AND calories IS NOT DISTINCT FROM %s AND ids_hash = %s
+              ORDER BY created_at DESC
+              LIMIT 1
+            """, _cache_key(user_payload))
+            row = await cur.fetchone()
+
+    if row:
+        logger.info("Plan cache hit")
+        return row["response_json"]
+    return None
+
+
+async def store_cached_plan(user_payload: Dict[str, Any], response_json: str) -> None:
+    """Cache an LLM response once it has passed schema and item-id validation."""
+    if not PLAN_CACHE_ENABLED:
+        return
+
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+              INSERT INTO plan_cache
+                (model, store, days, start_date, dietary_style, allergies, calories, ids_hash, response_json)
+              VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (*_cache_key(user_payload), response_json))
+        await conn.commit()
@@ -0,0 +1,60 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Optional, Tuple
+
+from .validators import MealPlanDoc
+from .config import RESPONSE_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+ResponseKey = Tuple[str, int, str, str, str, Optional[int], bool]
+
+# Validated plan docs by exact request key, least recently used first. Docs are
+# never mutated (callers use model_copy), so they are shared, not copied.
+_entries: "OrderedDict[ResponseKey, MealPlanDoc]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def response_key(
+    store: str,
+    days: int,
+    start: date,
+    dietary_style: str,
+    allergies: str,
+    calories: Optional[int],
+    detailed: bool,
+) -> ResponseKey:
+    """
+    Every input of a plan request, already normalized the way the query text
+    is built from them, so equal keys mean an identical query. The start date
+    is included because a plan's dates are baked into its JSON.
+    """
+    return (store, days, start.isoformat(), dietary_style, allergies, calories, detailed)
+
+
+def lookup_response(key: ResponseKey) -> Optional[MealPlanDoc]:
+    """Return the plan doc cached for key, if any."""
+    with _lock:
+        doc = _entries.get(key)
+        if doc is None:
+            return None
+        _entries.move_to_end(key)
+    logger.info("Response cache hit")
+    return doc
+
+
+def remember_response(key: ResponseKey, doc: MealPlanDoc) -> None:
+    if RESPONSE_CACHE_SIZE <= 0:
+        return
+    with _lock:
+        _entries[key] = doc
+        _entries.move_to_end(key)
+        while len(_entries) > RESPONSE_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def forget_response(key: ResponseKey) -> None:
+    with _lock:
+        _entries.pop(key, None)
@@ -1,46 +1,235 @@
-import json
-from typing import Any, Dict, List, Optional
+import orjson
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from psycopg import sql
 from .db import get_conn
-from .config import RETRIEVAL_K
+from .config import (
+    RETRIEVAL_K,
+    MAX_ITEMS_TO_LLM,
+    HNSW_EF_SEARCH,
+    HNSW_MAX_SCAN_TUPLES,
+    EMBED_COPY_THRESHOLD,
+    RETRIEVAL_BINARY_PREFILTER_K,
+    HNSW_FORCE_INDEX,
+    DB_PREPARE_THRESHOLD,
+)
+
+# Vector parameters use %b so pgvector sends them as packed float32 rather than
+# a "[0.123,...]" literal the server has to parse.
+# Hot statements are built once at import. With the pool's prepare_threshold=0,
+# identical statement text maps to one server-side prepared statement per
+# connection, so these are parsed and planned once rather than per call.
+_EMBEDDING_TABLES = ("item_embeddings", "item_nutrition_embeddings", "item_ingredients_embeddings")
+
+_UPSERT_SQL = {
+    table: sql.SQL("""
+      INSERT INTO {} (item_id, embedding, updated_at)
+      VALUES (%s, %b, CURRENT_TIMESTAMP)
+      ON CONFLICT (item_id) DO UPDATE
+      SET embedding = EXCLUDED.embedding, updated_at = CURRENT_TIMESTAMP
+    """).format(sql.Identifier(table))
+    for table in _EMBEDDING_TABLES
+}
+
+_MERGE_STAGE_SQL = {
+    table: sql.SQL("""
+      INSERT INTO {} (item_id, embedding, updated_at)
+      SELECT item_id, embedding, CURRENT_TIMESTAMP FROM _embedding_stage
+      ON CONFLICT (item_id) DO UPDATE
+      SET embedding = EXCLUDED.embedding, updated_at = CURRENT_TIMESTAMP
+    """).format(sql.Identifier(table))
+    for table in _EMBEDDING_TABLES
+}
+
+# Retrieval statements are server-prepared on their first execution on a
+# connection, regardless of the pool's prepare_threshold, unless prepared
+# statements are disabled altogether (PgBouncer transaction mode)
+_PREPARE = None if DB_PREPARE_THRESHOLD is None else True
+
+# force_custom_plan: the store literal must be visible to the planner for it to
+# pick a per-store partial HNSW index, which a generic prepared plan cannot do.
+# The prepared statement still saves parse/analysis on every call.
+_HNSW_SETTINGS_SQL = """
+  SELECT set_config('hnsw.ef_search', %s, true),
+         set_config('hnsw.iterative_scan', 'strict_order', true),
+         set_config('hnsw.max_scan_tuples', %s, true),
+         set_config('plan_cache_mode', 'force_custom_plan', true),
+         set_config('enable_seqscan', %s, true)
+"""
+
+# Top-K items by item_embeddings (HNSW index, filtered on the denormalized
+# ie.store_norm so the filter applies inside the index scan), joined to their
+# nutrition/ingredients JSON in the same round-trip. Embeddings are unit length,
+# so negative inner product (<#>) ranks like cosine. item_embeddings stores
+# halfvec, so the query vector is cast to match the index operator class.
+_TOPK_CANDIDATES_SQL = """
+  WITH topk AS (
+    SELECT i.id, i.name, i.price, i.unit_size, i.category_path, i.image_url,
+           ie.embedding <#> %b::halfvec AS distance
+    FROM item_embeddings ie
+    INNER JOIN items i ON i.id = ie.item_id
+    WHERE ie.store_norm = lower(%s)
+    ORDER BY distance
+    LIMIT %s
+  )
+  SELECT t.id, t.name, t.price, t.unit_size, t.category_path, t.image_url,
+         n.compact AS nutrition_compact, g.compact AS ingredients_compact,
+         -- raw JSON only for rows without a precomputed projection
+         CASE WHEN n.compact IS NULL THEN n.nutrition END AS nutrition,
+         CASE WHEN g.compact IS NULL THEN g.ingredients END AS ingredients
+  FROM topk t
+  LEFT JOIN item_nutrition n ON n.item_id = t.id
+  LEFT JOIN item_ingredients g ON g.item_id = t.id
+  ORDER BY t.distance
+"""
+
+# Names and categories only, for prompts that skip nutrition/ingredients
+_TOPK_CANDIDATES_LITE_SQL = """
+  SELECT i.id, i.name, i.category_path
+  FROM item_embeddings ie
+  INNER JOIN items i ON i.id = ie.item_id
+  WHERE ie.store_norm = lower(%s)
+  ORDER BY ie.embedding <#> %b::halfvec
+  LIMIT %s
+"""
+
+# Coarse shortlist by Hamming distance on the binary-quantized embeddings
+# (bit HNSW index); the halfvec embeddings come back, in binary format, for the
+# in-process rerank
+_BINARY_PREFILTER_SQL = """
+  SELECT ie.item_id, ie.embedding
+  FROM item_embeddings ie
+  WHERE ie.store_norm = lower(%s)
+  ORDER BY ie.embedding_b <~> binary_quantize(%b::halfvec)::bit(1536)
+  LIMIT %s
+"""
+
+# Candidate rows for reranked ids, kept in the given order
+_CANDIDATES_BY_ID_SQL = """
+  SELECT i.id, i.name, i.price, i.unit_size, i.category_path, i.image_url,
+         n.compact AS nutrition_compact, g.compact AS ingredients_compact,
+         CASE WHEN n.compact IS NULL THEN n.nutrition END AS nutrition,
+         CASE WHEN g.compact IS NULL THEN g.ingredients END AS ingredients
+  FROM unnest(%s::bigint[]) WITH ORDINALITY AS r(id, ord)
+  INNER JOIN items i ON i.id = r.id
+  LEFT JOIN item_nutrition n ON n.item_id = i.id
+  LEFT JOIN item_ingredients g ON g.item_id = i.id
+  ORDER BY r.ord
+"""
+
+_CANDIDATES_BY_ID_LITE_SQL = """
+  SELECT i.id, i.name, i.category_path
+  FROM unnest(%s::bigint[]) WITH ORDINALITY AS r(id, ord)
+  INNER JOIN items i ON i.id = r.id
+  ORDER BY r.ord
+"""
 
-def fetch_items_missing_embeddings(store: Optional[str], limit: int) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        with conn.cursor() as cur:
+_MISSING_ITEM_IDS_SQL = """
+  SELECT u.id FROM unnest(%s::bigint[]) AS u(id)
+  EXCEPT
+  SELECT id FROM items
+  WHERE store_norm = lower(%s) AND id = ANY(%s::bigint[])
+  ORDER BY id
+"""
+
+async def fetch_items_missing_embeddings(store: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
             if store:
-                cur.execute("""
-                  SELECT i.id, i.store, i.name, i.category_path, i.unit_size, i.price, i.tags_json
+                await cur.execute("""
+                  SELECT i.id, i.store, i.doc_text
                   FROM items i
                   LEFT JOIN item_embeddings ie ON i.id = ie.item_id
-                  WHERE i.store ILIKE %s AND ie.item_id IS NULL
+                  WHERE i.store_norm = lower(%s) AND ie.item_id IS NULL
+                    AND NOT EXISTS (
+                      SELECT 1 FROM embedding_batch_items bi
+                      WHERE bi.kind = 'items' AND bi.item_id = i.id
+                    )
                   ORDER BY i.id
                   LIMIT %s
                 """, (store, limit))
             else:
-                cur.execute("""
-                  SELECT i.id, i.store, i.name, i.category_path, i.unit_size, i.price, i.tags_json
+                await cur.execute("""
+                  SELECT i.id, i.store, i.doc_text
                   FROM items i
                   LEFT JOIN item_embeddings ie ON i.id = ie.item_id
                   WHERE ie.item_id IS NULL
+                    AND NOT EXISTS (
+                      SELECT 1 FROM embedding_batch_items bi
+                      WHERE bi.kind = 'items' AND bi.item_id = i.id
+                    )
                   ORDER BY i.id
                   LIMIT %s
                 """, (limit,))
-            return cur.fetchall()
-
-def upsert_item_embeddings(rows: List[Dict[str, Any]], vectors: List[List[float]]) -> int:
-    updated = 0
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            for r, v in zip(rows, vectors):
-                cur.execute("""
-                  INSERT INTO item_embeddings (item_id, embedding, updated_at)
-                  VALUES (%s, %s, CURRENT_TIMESTAMP)
-                  ON CONFLICT (item_id) DO UPDATE
-                  SET embedding = EXCLUDED.embedding, updated_at = CURRENT_TIMESTAMP
-                """, (r["id"], v))
-                updated += 1
-        conn.commit()
+            return await cur.fetchall()
+
+async def _upsert_embeddings(table: str, rows: List[Dict[str, Any]], vectors: Sequence[np.ndarray]) -> int:
+    params = [(r["id"], v) for r, v in zip(rows, vectors)]
+    if not params:
+        return 0
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            if len(params) < EMBED_COPY_THRESHOLD:
+                # executemany runs in pipeline mode (psycopg >= 3.1): every row's
+                # INSERT is sent back to back and the batch costs one round-trip
+                await cur.executemany(_UPSERT_SQL[table], params)
+            else:
+                await _copy_upsert(cur, table, params)
+            # Rows written by the server (executemany accumulates across the batch)
+            updated = cur.rowcount
+        await conn.commit()
     return updated
 
+async def _copy_upsert(cur, table: str, params: List[tuple]) -> None:
+    """
+    Stream a large batch into a temp table with binary COPY, so vectors are sent
+    as packed floats rather than text literals, then merge it in one statement.
+    The stage column is a plain vector; the merge casts to the target column
+    type (halfvec for item_embeddings) on assignment.
+    """
+    await cur.execute("""
+      CREATE TEMP TABLE _embedding_stage (item_id BIGINT, embedding vector) ON COMMIT DROP
+    """)
+    async with cur.copy("COPY _embedding_stage (item_id, embedding) FROM STDIN WITH (FORMAT BINARY)") as copy:
+        copy.set_types(["int8", "vector"])
+        for row in params:
+            await copy.write_row(row)
+    await cur.execute(_MERGE_STAGE_SQL[table])
+
+async def upsert_item_embeddings(rows: List[Dict[str, Any]], vectors: Sequence[np.ndarray]) -> int:
+    return await _upsert_embeddings("item_embeddings", rows, vectors)
+
+async def record_embedding_batch(kind: str, batch_id: str, rows: List[Dict[str, Any]], digests: Sequence[bytes]) -> None:
+    """
+    Hold rows submitted in a Batch API job so the missing-embedding fetches skip
+    them until the batch is released.
+    """
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany("""
+              INSERT INTO embedding_batch_items (kind, item_id, batch_id, text_sha)
+              VALUES (%s, %s, %s, %s)
+              ON CONFLICT (kind, item_id) DO NOTHING
+            """, [(kind, r["id"], batch_id, d) for r, d in zip(rows, digests)])
+        await conn.commit()
+
+async def fetch_embedding_batch_digests(batch_id: str) -> Dict[int, bytes]:
+    """Text digest of each row submitted in a batch, keyed by item id."""
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+              SELECT item_id, text_sha FROM embedding_batch_items WHERE batch_id = %s
+            """, (batch_id,))
+            return {r["item_id"]: bytes(r["text_sha"]) for r in await cur.fetchall()}
+
+async def release_embedding_batch(batch_id: str) -> None:
+    """Make a batch's rows eligible for backfill again (ingested or the batch ended without results)."""
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM embedding_batch_items WHERE batch_id = %s", (batch_id,))
+        await conn.commit()
+
 def _compact_nutrition(nutrition_json: Dict[str, Any] | str | None) -> Dict[str, Any] | None:
     """
     nutrition_json can be:
@@ -54,8 +243,8 @@ def _compact_nutrition(nutrition_json: Dict[str, Any] | str | None) -> Dict[str,
     # Parse JSON string if needed
     if isinstance(nutrition_json, str):
         try:
-            nutrition_json = json.loads(nutrition_json)
-        except (json.JSONDecodeError, TypeError):
+            nutrition_json = orjson.loads(nutrition_json)
+        except (orjson.JSONDecodeError, TypeError):
             return None
     
     if not isinstance(nutrition_json, dict):
@@ -94,8 +283,8 @@ def _compact_ingredients(ingredients_json: Dict[str, Any] | str | None) -> Dict[
     # Parse JSON string if needed
     if isinstance(ingredients_json, str):
         try:
-            ingredients_json = json.loads(ingredients_json)
-        except (json.JSONDecodeError, TypeError):
+            ingredients_json = orjson.loads(ingredients_json)
+        except (orjson.JSONDecodeError, TypeError):
             return None
     
     if not isinstance(ingredients_json, dict):
@@ -121,62 +310,83 @@ def _compact_ingredients(ingredients_json: Dict[str, Any] | str | None) -> Dict[
         "ingredients_count": parsed.get("ingredients_count"),
     }
 
-def retrieve_candidates(store: str, query_vec: List[float], k: int = RETRIEVAL_K) -> List[Dict[str, Any]]:
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            # 1) Retrieve top-K items by item_embeddings
-            cur.execute("""
-              SELECT i.id, i.name, i.price, i.unit_size, i.category_path, i.image_url
-              FROM items i
-              INNER JOIN item_embeddings ie ON i.id = ie.item_id
-              WHERE i.store ILIKE %s
-              ORDER BY ie.embedding <=> %s::vector
-              LIMIT %s
-            """, (store, query_vec, k))
-            items = cur.fetchall()
-
-            if not items:
-                return []
-
-            item_ids = [row["id"] for row in items]
-
-            # 2) Fetch nutrition JSON for these items
-            cur.execute("""
-              SELECT item_id, nutrition
-              FROM item_nutrition
-              WHERE item_id = ANY(%s)
-            """, (item_ids,))
-            nutrition_rows = cur.fetchall()
-            nutrition_by_id = {r["item_id"]: r["nutrition"] for r in nutrition_rows}
-
-            # 3) Fetch ingredients JSON for these items
-            cur.execute("""
-              SELECT item_id, ingredients
-              FROM item_ingredients
-              WHERE item_id = ANY(%s)
-            """, (item_ids,))
-            ingredients_rows = cur.fetchall()
-            ingredients_by_id = {r["item_id"]: r["ingredients"] for r in ingredients_rows}
-
-            # 4) Merge into enriched candidate objects
+async def _set_hnsw_search(conn, k: int) -> None:
+    # Scope the HNSW search settings to the current transaction. Iterative scans keep
+    # walking the index until K in-store rows are found instead of returning
+    # fewer candidates once the store filter is applied. Runs on its own cursor
+    # so, inside a pipeline, it is queued ahead of the query without a round-trip.
+    await conn.execute(
+        _HNSW_SETTINGS_SQL,
+        (str(max(HNSW_EF_SEARCH, k)), str(HNSW_MAX_SCAN_TUPLES), "off" if HNSW_FORCE_INDEX else "on"),
+        prepare=_PREPARE,
+    )
+
+async def _binary_prefilter_ids(conn, cur, store: str, query_vec: np.ndarray, k: int) -> List[int]:
+    """
+    Two-stage top-K: shortlist RETRIEVAL_BINARY_PREFILTER_K items by Hamming
+    distance on the bit index, then rerank the shortlist by inner product with
+    one matrix-vector product and return the best k ids, closest first.
+    """
+    shortlist = max(RETRIEVAL_BINARY_PREFILTER_K, k)
+    await _set_hnsw_search(conn, shortlist)
+    await cur.execute(_BINARY_PREFILTER_SQL, (store, query_vec, shortlist), prepare=_PREPARE, binary=True)
+    rows = await cur.fetchall()
+    if not rows:
+        return []
+
+    # halfvec rows load as float16; widen once so the product runs through BLAS
+    matrix = np.stack([r["embedding"].to_numpy() for r in rows]).astype(np.float32)
+    scores = matrix @ np.asarray(query_vec, dtype=np.float32)
+    if len(rows) > k:
+        top = np.argpartition(-scores, k)[:k]
+    else:
+        top = np.arange(len(rows))
+    top = top[np.argsort(-scores[top])]
+    return [rows[i]["item_id"] for i in top]
+
+async def retrieve_candidates_lite(store: str, query_vec: np.ndarray, k: int = RETRIEVAL_K) -> List[Dict[str, Any]]:
+    """Top-K candidates with id, name and category_path only."""
+    async with get_conn() as conn, conn.transaction(), conn.pipeline():
+        async with conn.cursor() as cur:
+            if RETRIEVAL_BINARY_PREFILTER_K > 0:
+                ids = await _binary_prefilter_ids(conn, cur, store, query_vec, k)
+                await cur.execute(_CANDIDATES_BY_ID_LITE_SQL, (ids,), prepare=_PREPARE)
+            else:
+                await _set_hnsw_search(conn, k)
+                await cur.execute(_TOPK_CANDIDATES_LITE_SQL, (store, query_vec, k), prepare=_PREPARE)
+            return await cur.fetchall()
+
+async def retrieve_candidates(store: str, query_vec: np.ndarray, k: int = RETRIEVAL_K) -> List[Dict[str, Any]]:
+    # Pipeline mode: BEGIN, the HNSW settings and the top-K query go out back to
+    # back and the only wait is on fetchall
+    async with get_conn() as conn, conn.transaction(), conn.pipeline():
+        async with conn.cursor() as cur:
+            if RETRIEVAL_BINARY_PREFILTER_K > 0:
+                ids = await _binary_prefilter_ids(conn, cur, store, query_vec, k)
+                await cur.execute(_CANDIDATES_BY_ID_SQL, (ids,), prepare=_PREPARE)
+            else:
+                await _set_hnsw_search(conn, k)
+                await cur.execute(_TOPK_CANDIDATES_SQL, (query_vec, store, k), prepare=_PREPARE)
+            items = await cur.fetchall()
+
+            # Build enriched candidate objects
             enriched: List[Dict[str, Any]] = []
             for it in items:
-                iid = it["id"]
-
-                nutrition_json = nutrition_by_id.get(iid)
-                ingredients_json = ingredients_by_id.get(iid)
+                nutrition_json = it["nutrition"]
+                ingredients_json = it["ingredients"]
 
                 enriched.append({
-                    "id": iid,
+                    "id": it["id"],
                     "name": it["name"],
                     "price": it.get("price"),
                     "unit_size": it.get("unit_size"),
                     "category_path": it.get("category_path"),
                     "image_url": it.get("image_url"),
 
-                    # Enriched fields (compact to keep prompt small)
-                    "nutrition": _compact_nutrition(nutrition_json),
-                    "ingredients": _compact_ingredients(ingredients_json),
+                    # Enriched fields (compact to keep prompt small). Precomputed on write
+                    # by trigger; parse in Python only for rows that lack it
+                    "nutrition": it["nutrition_compact"] or _compact_nutrition(nutrition_json),
+                    "ingredients": it["ingredients_compact"] or _compact_ingredients(ingredients_json),
 
                     # Optional: keep raw JSON too (usually OFF to avoid prompt bloat)
                     # "nutrition_raw": nutrition_json,
@@ -185,35 +395,80 @@ def retrieve_candidates(store: str, query_vec: List[float], k: int = RETRIEVAL_K
 
             return enriched
 
-def verify_ids(store: str, ids: List[int]) -> bool:
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-              SELECT id FROM items
-              WHERE store ILIKE %s AND id = ANY(%s)
-            """, (store, ids))
-            rows = cur.fetchall()
-    return len(rows) == len(set(ids))
-
-def fetch_nutrition_missing_embeddings(store: Optional[str], limit: int) -> List[Dict[str, Any]]:
+# Ingredient names sent per item; the planner only needs the leading ones
+_LLM_MAX_INGREDIENT_NAMES = 10
+
+def _trim_for_llm(compact: Dict[str, Any] | None) -> Dict[str, Any] | None:
+    """Drop null fields, round float amounts to 1 decimal and cap ingredient names."""
+    if not compact:
+        return None
+    trimmed: Dict[str, Any] = {}
+    for k, v in compact.items():
+        if v is None:
+            continue
+        if isinstance(v, float):
+            v = round(v, 1)
+        elif k == "ingredients_names":
+            v = v[:_LLM_MAX_INGREDIENT_NAMES]
+        trimmed[k] = v
+    return trimmed
+
+def project_for_llm(candidates: List[Dict[str, Any]], limit: int = MAX_ITEMS_TO_LLM) -> List[Dict[str, Any]]:
+    """
+    Trim candidates to the fields the meal planner actually uses. Prompt tokens
+    dominate LLM cost and latency, so image URLs, unit sizes and prices are
+    dropped, the category path is reduced to its leaf and empty fields omitted.
+    Nutrition/ingredients blocks are trimmed the same way.
+    """
+    projected: List[Dict[str, Any]] = []
+    for c in candidates[:limit]:
+        category = (c.get("category_path") or "").rstrip("/").rsplit("/", 1)[-1].strip()
+        item = {
+            "id": c["id"],
+            "name": (c.get("name") or "")[:60],
+            "category": category,
+            "nutrition": _trim_for_llm(c.get("nutrition")),
+            "ingredients": _trim_for_llm(c.get("ingredients")),
+        }
+        projected.append({k: v for k, v in item.items() if v not in (None, "", [], {})})
+    return projected
+
+async def find_missing_item_ids(store: str, ids: List[int]) -> List[int]:
+    """Return the ids (sorted) that do not exist in items for the given store."""
+    # Deduplicate client-side so the array sent and unnested is as small as possible
+    unique_ids = sorted(set(ids))
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(_MISSING_ITEM_IDS_SQL, (unique_ids, store, unique_ids))
+            rows = await cur.fetchall()
+    return [r["id"] for r in rows]
+
+async def verify_ids(store: str, ids: List[int]) -> bool:
+    return not await find_missing_item_ids(store, ids)
+
+async def fetch_nutrition_missing_embeddings(store: Optional[str], limit: int) -> List[Dict[str, Any]]:
     """Fetch items with nutrition data that are missing embeddings."""
-    with get_conn() as conn:
-        with conn.cursor() as cur:
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
             if store:
-                cur.execute("""
+                await cur.execute("""
                   SELECT i.id, i.store, inut.nutrition
                   FROM items i
                   INNER JOIN item_nutrition inut ON i.id = inut.item_id
                   LEFT JOIN item_nutrition_embeddings ine ON i.id = ine.item_id
-                  WHERE i.store ILIKE %s 
+                  WHERE i.store_norm = lower(%s) 
                     AND inut.nutrition IS NOT NULL 
                     AND inut.nutrition != ''
                     AND ine.item_id IS NULL
+                    AND NOT EXISTS (
+                      SELECT 1 FROM embedding_batch_items bi
+                      WHERE bi.kind = 'nutrition' AND bi.item_id = i.id
+                    )
                   ORDER BY i.id
                   LIMIT %s
                 """, (store, limit))
             else:
-                cur.execute("""
+                await cur.execute("""
                   SELECT i.id, i.store, inut.nutrition
                   FROM items i
                   INNER JOIN item_nutrition inut ON i.id = inut.item_id
@@ -221,30 +476,38 @@ def fetch_nutrition_missing_embeddings(store: Optional[str], limit: int) -> List
                   WHERE inut.nutrition IS NOT NULL 
                     AND inut.nutrition != ''
                     AND ine.item_id IS NULL
+                    AND NOT EXISTS (
+                      SELECT 1 FROM embedding_batch_items bi
+                      WHERE bi.kind = 'nutrition' AND bi.item_id = i.id
+                    )
                   ORDER BY i.id
                   LIMIT %s
                 """, (limit,))
-            return cur.fetchall()
+            return await cur.fetchall()
 
-def fetch_ingredients_missing_embeddings(store: Optional[str], limit: int) -> List[Dict[str, Any]]:
+async def fetch_ingredients_missing_embeddings(store: Optional[str], limit: int) -> List[Dict[str, Any]]:
     """Fetch items with ingredients data that are missing embeddings."""
-    with get_conn() as conn:
-        with conn.cursor() as cur:
+    async with get_conn() as conn:
+        async with conn.cursor() as cur:
             if store:
-                cur.execute("""
+                await cur.execute("""
                   SELECT i.id, i.store, ing.ingredients
                   FROM items i
                   INNER JOIN item_ingredients ing ON i.id = ing.item_id
                   LEFT JOIN item_ingredients_embeddings iie ON i.id = iie.item_id
-                  WHERE i.store ILIKE %s 
+                  WHERE i.store_norm = lower(%s) 
                     AND ing.ingredients IS NOT NULL 
                     AND ing.ingredients != ''
                     AND iie.item_id IS NULL
+                    AND NOT EXISTS (
+                      SELECT 1 FROM embedding_batch_items bi
+                      WHERE bi.kind = 'ingredients' AND bi.item_id = i.id
+                    )
                   ORDER BY i.id
                   LIMIT %s
                 """, (store, limit))
             else:
-                cur.execute("""
+                await cur.execute("""
                   SELECT i.id, i.store, ing.ingredients
                   FROM items i
                   INNER JOIN item_ingredients ing ON i.id = ing.item_id
@@ -252,39 +515,19 @@ def fetch_ingredients_missing_embeddings(store: Optional[str], limit: int) -> Li
                   WHERE ing.ingredients IS NOT NULL 
                     AND ing.ingredients != ''
                     AND iie.item_id IS NULL
+                    AND NOT EXISTS (
+                      SELECT 1 FROM embedding_batch_items bi
+                      WHERE bi.kind = 'ingredients' AND bi.item_id = i.id
+                    )
                   ORDER BY i.id
                   LIMIT %s
                 """, (limit,))
-            return cur.fetchall()
+            return await cur.fetchall()
 
-def upsert_nutrition_embeddings(rows: List[Dict[str, Any]], vectors: List[List[float]]) -> int:
+async def upsert_nutrition_embeddings(rows: List[Dict[str, Any]], vectors: Sequence[np.ndarray]) -> int:
     """Upsert nutrition embeddings."""
-    updated = 0
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            for r, v in zip(rows, vectors):
-                cur.execute("""
-                  INSERT INTO item_nutrition_embeddings (item_id, embedding, updated_at)
-                  VALUES (%s, %s, CURRENT_TIMESTAMP)
-                  ON CONFLICT (item_id) DO UPDATE
-                  SET embedding = EXCLUDED.embedding, updated_at = CURRENT_TIMESTAMP
-                """, (r["id"], v))
-                updated += 1
-        conn.commit()
-    return updated
+    return await _upsert_embeddings("item_nutrition_embeddings", rows, vectors)
 
-def upsert_ingredients_embeddings(rows: List[Dict[str, Any]], vectors: List[List[float]]) -> int:
+async def upsert_ingredients_embeddings(rows: List[Dict[str, Any]], vectors: Sequence[np.ndarray]) -> int:
     """Upsert ingredients embeddings."""
-    updated = 0
-    with get_conn() as conn:
-        with conn.cursor() as cur:
-            for r, v in zip(rows, vectors):
-                cur.execute("""
-                  INSERT INTO item_ingredients_embeddings (item_id, embedding, updated_at)
-                  VALUES (%s, %s, CURRENT_TIMESTAMP)
-                  ON CONFLICT (item_id) DO UPDATE
-                  SET embedding = EXCLUDED.embedding, updated_at = CURRENT_TIMESTAMP
-                """, (r["id"], v))
-                updated += 1
-        conn.commit()
-    return updated
+    return await _upsert_embeddings("item_ingredients_embeddings", rows, vectors)
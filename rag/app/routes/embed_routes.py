@@ -1,64 +1,142 @@
+import asyncio
 import logging
 from fastapi import APIRouter, Header, HTTPException
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
 
 from ..models import BackfillRequest, BackfillResponse
-from ..config import RAG_SHARED_SECRET
+from ..config import RAG_SHARED_SECRET, EMBED_MODEL, EMBED_BATCH_API_THRESHOLD, BACKFILL_CHUNK_SIZE
 from ..retrieval import (
     fetch_items_missing_embeddings, 
     upsert_item_embeddings,
     fetch_nutrition_missing_embeddings,
     fetch_ingredients_missing_embeddings,
     upsert_nutrition_embeddings,
-    upsert_ingredients_embeddings
+    upsert_ingredients_embeddings,
+    record_embedding_batch,
+    fetch_embedding_batch_digests,
+    release_embedding_batch,
+)
+from ..embedding import (
+    nutrition_doc,
+    ingredients_doc,
+    embed_texts,
+    submit_batch_embeddings,
+    fetch_batch_embeddings,
+    text_digest,
 )
-from ..embedding import item_doc, nutrition_doc, ingredients_doc, embed_texts
+from ..embed_cache import store_embeddings
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/embed", tags=["embed"])
 
+# Per backfill kind: row fetcher, doc builder and upsert (also used when ingesting Batch API results)
+FETCHES: Dict[str, Callable[[Optional[str], int], Awaitable[List[Dict[str, Any]]]]] = {
+    "items": fetch_items_missing_embeddings,
+    "nutrition": fetch_nutrition_missing_embeddings,
+    "ingredients": fetch_ingredients_missing_embeddings,
+}
+DOCS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    # items.doc_text is a generated column holding the embedding text
+    "items": lambda r: r["doc_text"],
+    "nutrition": nutrition_doc,
+    "ingredients": ingredients_doc,
+}
+UPSERTS: Dict[str, Callable[[List[Dict[str, Any]], Sequence[np.ndarray]], Awaitable[int]]] = {
+    "items": upsert_item_embeddings,
+    "nutrition": upsert_nutrition_embeddings,
+    "ingredients": upsert_ingredients_embeddings,
+}
+
 def auth(secret: Optional[str]):
     if RAG_SHARED_SECRET and secret != RAG_SHARED_SECRET:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-@router.post("/backfill/items", response_model=BackfillResponse)
-def backfill(req: BackfillRequest, x_rag_secret: Optional[str] = Header(default=None)):
-    """Backfill embeddings for items."""
-    auth(x_rag_secret)
+async def submit_backfill_batch(kind: str, rows: List[Dict[str, Any]], texts: List[str]) -> BackfillResponse:
+    """
+    Large backfills are not latency-sensitive, so send them through the Batch API.
+    Ingest the results later via POST /embed/batch/{batch_id}/ingest; until then
+    the rows are held so repeated backfill calls don't submit them again.
+    """
+    batch_id = await submit_batch_embeddings(texts, [str(r["id"]) for r in rows], {"kind": kind})
+    await record_embedding_batch(kind, batch_id, rows, [text_digest(t) for t in texts])
+    return BackfillResponse(updated=0, skipped=0, batchId=batch_id, batchStatus="submitted")
 
-    rows = fetch_items_missing_embeddings(req.store, req.limit)
+async def run_backfill(kind: str, req: BackfillRequest) -> BackfillResponse:
+    """Fetch rows missing a `kind` embedding, embed their docs and upsert the vectors."""
+    rows = await FETCHES[kind](req.store, req.limit)
     if not rows:
         return BackfillResponse(updated=0, skipped=0)
 
-    texts = [item_doc(r) for r in rows]
-    vectors = embed_texts(texts)
-    updated = upsert_item_embeddings(rows, vectors)
+    texts = [DOCS[kind](r) for r in rows]
+    if len(rows) > EMBED_BATCH_API_THRESHOLD:
+        return await submit_backfill_batch(kind, rows, texts)
+
+    # Pipeline the chunks: chunk N upserts in the background while chunk N+1 is
+    # being embedded, so each step costs max(embed, upsert) rather than the sum
+    updated = 0
+    upserting: Optional[asyncio.Task] = None
+    try:
+        for start in range(0, len(rows), BACKFILL_CHUNK_SIZE):
+            chunk = rows[start:start + BACKFILL_CHUNK_SIZE]
+            vectors = await embed_texts(texts[start:start + BACKFILL_CHUNK_SIZE])
+            if upserting is not None:
+                updated += await upserting
+            upserting = asyncio.create_task(UPSERTS[kind](chunk, vectors))
+        if upserting is not None:
+            updated += await upserting
+            upserting = None
+    finally:
+        if upserting is not None and not upserting.done():
+            upserting.cancel()
     return BackfillResponse(updated=updated, skipped=0)
 
+@router.post("/backfill/items", response_model=BackfillResponse)
+async def backfill(req: BackfillRequest, x_rag_secret: Optional[str] = Header(default=None)):
+    """Backfill embeddings for items."""
+    auth(x_rag_secret)
+    return await run_backfill("items", req)
+
 @router.post("/backfill/nutrition", response_model=BackfillResponse)
-def backfill_nutrition(req: BackfillRequest, x_rag_secret: Optional[str] = Header(default=None)):
+async def backfill_nutrition(req: BackfillRequest, x_rag_secret: Optional[str] = Header(default=None)):
     """Backfill embeddings for item nutrition data."""
     auth(x_rag_secret)
-
-    rows = fetch_nutrition_missing_embeddings(req.store, req.limit)
-    if not rows:
-        return BackfillResponse(updated=0, skipped=0)
-
-    texts = [nutrition_doc(r) for r in rows]
-    vectors = embed_texts(texts)
-    updated = upsert_nutrition_embeddings(rows, vectors)
-    return BackfillResponse(updated=updated, skipped=0)
+    return await run_backfill("nutrition", req)
 
 @router.post("/backfill/ingredients", response_model=BackfillResponse)
-def backfill_ingredients(req: BackfillRequest, x_rag_secret: Optional[str] = Header(default=None)):
+async def backfill_ingredients(req: BackfillRequest, x_rag_secret: Optional[str] = Header(default=None)):
     """Backfill embeddings for item ingredients data."""
     auth(x_rag_secret)
+    return await run_backfill("ingredients", req)
 
-    rows = fetch_ingredients_missing_embeddings(req.store, req.limit)
-    if not rows:
-        return BackfillResponse(updated=0, skipped=0)
+@router.post("/batch/{batch_id}/ingest", response_model=BackfillResponse)
+async def poll_and_ingest(batch_id: str, x_rag_secret: Optional[str] = Header(default=None)):
+    """Upsert the results of a completed Batch API backfill."""
+    auth(x_rag_secret)
 
-    texts = [ingredients_doc(r) for r in rows]
-    vectors = embed_texts(texts)
-    updated = upsert_ingredients_embeddings(rows, vectors)
-    return BackfillResponse(updated=updated, skipped=0)
+    batch, vectors_by_id = await fetch_batch_embeddings(batch_id)
+    if batch.status in ("failed", "expired", "cancelled"):
+        # No results are coming; let the next backfill pick these rows up again
+        await release_embedding_batch(batch_id)
+    if batch.status != "completed":
+        return BackfillResponse(updated=0, skipped=0, batchId=batch_id, batchStatus=batch.status)
+
+    kind = (batch.metadata or {}).get("kind")
+    upsert = UPSERTS.get(kind)
+    if upsert is None:
+        raise HTTPException(status_code=400, detail=f"Unknown backfill kind for batch {batch_id}: {kind}")
+
+    rows = [{"id": int(cid)} for cid in vectors_by_id]
+    vectors = list(vectors_by_id.values())
+    updated = await upsert(rows, vectors)
+
+    # Fill the content-hash cache like the synchronous path does
+    digests = await fetch_embedding_batch_digests(batch_id)
+    await store_embeddings(EMBED_MODEL, [
+        (digests[r["id"]], vec) for r, vec in zip(rows, vectors) if r["id"] in digests
+    ])
+    await release_embedding_batch(batch_id)
+    skipped = batch.request_counts.failed if batch.request_counts else 0
+    logger.info("Ingested embedding batch %s (%s): updated=%d skipped=%d", batch_id, kind, updated, skipped)
+    return BackfillResponse(updated=updated, skipped=skipped, batchId=batch_id, batchStatus=batch.status)
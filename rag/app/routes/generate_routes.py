@@ -1,17 +1,20 @@
-import json
 import logging
 import uuid
-from datetime import date, timedelta
+from datetime import date
 from typing import Optional
 
+import numpy as np
+import orjson
 from fastapi import APIRouter, Header, HTTPException
 
 from ..models import GenerateRequest, GenerateResponse
 from ..config import RAG_SHARED_SECRET
-from ..embedding import embed_one
-from ..retrieval import retrieve_candidates
+from ..embedding import embed_batcher
+from ..retrieval import retrieve_candidates, retrieve_candidates_lite, project_for_llm, find_missing_item_ids
 from ..llm import call_mealplan_llm
-from ..validators import parse_and_validate_plan_json, extract_item_ids
+from ..plan_cache import lookup_cached_plan, store_cached_plan
+from ..response_cache import response_key, lookup_response, remember_response, forget_response
+from ..validators import MealPlanDoc, PlanMeta, parse_and_validate_plan_json, extract_item_ids
 from ..verify import verify_item_ids_belong_to_store
 from ..config import CHAT_MODEL, EMBED_MODEL, RETRIEVAL_K
 
@@ -22,38 +25,51 @@ def auth(secret: Optional[str]):
     if RAG_SHARED_SECRET and secret != RAG_SHARED_SECRET:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-@router.post("/generate", response_model=GenerateResponse)
-def generate(req: GenerateRequest, x_rag_secret: Optional[str] = Header(default=None)):
-    auth(x_rag_secret)
-
-    if req.days < 1 or req.days > 14:
-        raise HTTPException(status_code=400, detail="days must be between 1 and 14")
-
+def _normalize_store(store: str) -> str:
+    return store.strip().lower()
+
+def _normalize_allergies(allergies: Optional[str]) -> str:
+    """Lowercased, de-duplicated, sorted comma list ("Shellfish, peanuts" == "peanuts,shellfish")."""
+    names = {a.strip().lower() for a in (allergies or "").split(",")}
+    names.discard("")
+    return ", ".join(sorted(names)) or "none"
+
+def _normalize_dietary_style(dietary_style: Optional[str]) -> str:
+    return (dietary_style or "").strip().lower() or "none"
+
+def build_query_text(req: GenerateRequest) -> str:
+    """
+    Retrieval query for a request. Preferences are normalized first so that
+    equivalent requests produce identical text and share one cached embedding
+    (in-process LRU, then the embedding_cache table) instead of each costing
+    an OpenAI call.
+    """
     # Format dietary style for better LLM understanding
-    dietary_style = req.preferences.dietaryRestrictions or "none"
-    if dietary_style and dietary_style != "none":
+    dietary_style = _normalize_dietary_style(req.preferences.dietaryRestrictions)
+    if dietary_style != "none":
         # Convert hyphenated values to more readable format
         dietary_style_formatted = dietary_style.replace("-", " ").title()
     else:
         dietary_style_formatted = dietary_style
-    
-    query_text = f"""
-    Create a {req.days}-day meal plan using {req.store} grocery items.
+
+    return f"""
+    Create a {req.days}-day meal plan using {_normalize_store(req.store)} grocery items.
     Dietary style: {dietary_style_formatted}.
-    Allergies: {req.preferences.allergies or "none"}.
+    Allergies: {_normalize_allergies(req.preferences.allergies)}.
     Target calories per day: {req.preferences.targetCaloriesPerDay or "not specified"}.
     Prefer variety and practical meals.
     """.strip()
 
-    qvec = embed_one(query_text)
-    candidates = retrieve_candidates(req.store, qvec)
+async def build_plan(req: GenerateRequest, qvec: np.ndarray, start: date) -> MealPlanDoc:
+    """Retrieve candidates, call the LLM (or plan cache) and return the validated plan doc."""
+    if req.detailed:
+        candidates = await retrieve_candidates(req.store, qvec)
+    else:
+        candidates = await retrieve_candidates_lite(req.store, qvec)
 
     if not candidates:
         raise HTTPException(status_code=400, detail="No embedded items found. Run /embed/backfill first.")
 
-    start = date.today()
-    end = start + timedelta(days=req.days - 1)
-
     system = "You are a meal-planning assistant. Only use the provided items."
     # Safely serialize preferences - handle None values
     prefs_dict = req.preferences.model_dump() if req.preferences else {}
@@ -62,39 +78,76 @@ def generate(req: GenerateRequest, x_rag_secret: Optional[str] = Header(default=
         "days": req.days,
         "startDate": str(start),
         "preferences": prefs_dict,
-        "items": candidates
+        "items": project_for_llm(candidates)
     }
 
     # Log OpenAI API input
     logger.info("OpenAI API input - System: %s", system)
-    logger.info("OpenAI API input - Payload: %s", json.dumps(payload, indent=2, ensure_ascii=False))
-    logger.info("OpenAI API input - Number of candidates: %d", len(candidates))
-
-    content = call_mealplan_llm(system, payload, temperature=0.4)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("OpenAI API input - Payload: %s", orjson.dumps(payload).decode())
+    logger.info("OpenAI API input - Number of candidates: %d", len(payload["items"]))
+
+    content = await lookup_cached_plan(payload)
+    from_cache = content is not None
+    if not from_cache:
+        content = await call_mealplan_llm(system, payload, temperature=0.4)
     if not content:
         raise HTTPException(status_code=500, detail="LLM returned empty response")
 
-    rag_id = str(uuid.uuid4())
-
     doc = parse_and_validate_plan_json(content)
 
     # Verify IDs exist + store matches
     ids = extract_item_ids(doc)
-    verify_item_ids_belong_to_store(req.store, ids)
-
-    # Add traceable meta
-    doc_dict = doc.model_dump()
-    doc_dict["_meta"] = {
-        "generatedBy": "python-rag-openai",
-        "model": CHAT_MODEL,
-        "embeddingModel": EMBED_MODEL,
-        "ragRequestId": rag_id,
-        "retrievalK": RETRIEVAL_K
-    }
+    await verify_item_ids_belong_to_store(req.store, ids)
+
+    # Only cache responses that passed validation
+    if not from_cache:
+        await store_cached_plan(payload, content)
+
+    return doc
+
+@router.post("/generate", response_model=GenerateResponse)
+async def generate(req: GenerateRequest, x_rag_secret: Optional[str] = Header(default=None)):
+    auth(x_rag_secret)
+
+    if req.days < 1 or req.days > 14:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 14")
+
+    start = date.today()
+
+    # Same normalization as build_query_text, so a key hit implies the same query
+    prefs = req.preferences
+    cache_key = response_key(
+        _normalize_store(req.store),
+        req.days,
+        start,
+        _normalize_dietary_style(prefs.dietaryRestrictions),
+        _normalize_allergies(prefs.allergies),
+        prefs.targetCaloriesPerDay,
+        req.detailed,
+    )
+    doc = lookup_response(cache_key)
+    if doc is not None and await find_missing_item_ids(req.store, extract_item_ids(doc)):
+        # Items were removed or changed store since the plan was cached
+        forget_response(cache_key)
+        doc = None
+    if doc is None:
+        qvec = await embed_batcher.embed(build_query_text(req))
+        doc = await build_plan(req, qvec, start)
+        remember_response(cache_key, doc)
+
+    # Add traceable meta (a fresh request id even when served from cache)
+    doc = doc.model_copy(update={"meta": PlanMeta(
+        generatedBy="python-rag-openai",
+        model=CHAT_MODEL,
+        embeddingModel=EMBED_MODEL,
+        ragRequestId=str(uuid.uuid4()),
+        retrievalK=RETRIEVAL_K,
+    )})
 
     return GenerateResponse(
-        title=doc_dict["title"],
-        startDate=doc_dict["startDate"],
-        endDate=doc_dict["endDate"],
-        planJson=json.dumps(doc_dict)
+        title=doc.title,
+        startDate=doc.startDate,
+        endDate=doc.endDate,
+        planJson=doc.model_dump_json(by_alias=True)
     )
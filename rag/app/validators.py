@@ -1,5 +1,4 @@
 # app/validators.py
-import json
 from typing import List, Literal, Optional
 
 from fastapi import HTTPException
@@ -36,7 +35,9 @@ class MealPlanDoc(BaseModel):
     startDate: str
     endDate: str
     plan: List[DayPlan]
-    _meta: Optional[PlanMeta] = None
+    # Filled in by the route, never read from LLM output; serialized as "_meta"
+    # via model_dump_json(by_alias=True)
+    meta: Optional[PlanMeta] = Field(default=None, serialization_alias="_meta")
 
 
 def parse_and_validate_plan_json(content: str) -> MealPlanDoc:
@@ -48,15 +49,13 @@ def parse_and_validate_plan_json(content: str) -> MealPlanDoc:
         raise HTTPException(status_code=500, detail="LLM returned empty response")
 
     try:
-        raw = json.loads(content)
-    except Exception:
-        raise HTTPException(status_code=500, detail="LLM did not return valid JSON")
-
-    try:
-        return MealPlanDoc.model_validate(raw)
+        # Parse and validate in a single pass over the JSON text
+        return MealPlanDoc.model_validate_json(content)
     except ValidationError as e:
         # Keep it short; too many errors gets noisy
         errors = e.errors()
+        if errors and errors[0]["type"] == "json_invalid":
+            raise HTTPException(status_code=500, detail="LLM did not return valid JSON")
         raise HTTPException(
             status_code=500,
             detail={
@@ -67,9 +66,4 @@ def parse_and_validate_plan_json(content: str) -> MealPlanDoc:
 
 
 def extract_item_ids(doc: MealPlanDoc) -> List[int]:
-    ids: List[int] = []
-    for day in doc.plan:
-        for meal in day.meals:
-            for it in meal.items:
-                ids.append(it.id)
-    return ids
+    return [it.id for day in doc.plan for meal in day.meals for it in meal.items]
@@ -1,15 +1,32 @@
 import os
-import json
+import asyncio
+import base64
+import hashlib
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Tuple
 
+import httpx
+import numpy as np
 import psycopg
+import tiktoken
 from psycopg.rows import dict_row
-from pgvector.psycopg import register_vector
+from pgvector.psycopg import register_vector_async
 from dotenv import load_dotenv
 from tqdm import tqdm
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+# Request sizing is shared with the RAG service (rag/app/embedding.py), so the
+# rag directory must be on the import path; see main() for how to run this
+try:
+    from app.embed_batching import pack_batches, truncate_texts
+except ModuleNotFoundError as e:
+    if e.name not in ("app", "app.embed_batching"):
+        raise
+    raise RuntimeError(
+        "Run from the repo root with the RAG service on the path: "
+        "PYTHONPATH=rag python3 scripts/backfill_item_embeddings.py"
+    ) from e
 
 load_dotenv()
 
@@ -23,134 +40,209 @@ elif not DATABASE_URL:
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", "128"))
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "1024"))
+# Each DB batch is split into API requests under these limits and sent concurrently
+EMBED_MAX_INPUTS_PER_REQUEST = int(os.getenv("EMBED_MAX_INPUTS_PER_REQUEST", "256"))
+EMBED_MAX_TOKENS_PER_REQUEST = int(os.getenv("EMBED_MAX_TOKENS_PER_REQUEST", "300000"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "5"))
+# text-embedding-3 context; longer inputs are rejected by the API, so truncate them
+EMBED_MAX_INPUT_TOKENS = int(os.getenv("EMBED_MAX_INPUT_TOKENS", "8191"))
 
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is required")
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is required")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Keep-alive connections for the concurrent requests; transient 429/5xx errors are
+# retried with backoff rather than aborting the run
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "4")),
+    timeout=httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT_S", "60")), connect=5.0),
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=EMBED_CONCURRENCY * 2, max_keepalive_connections=EMBED_CONCURRENCY),
+    ),
+)
+
+try:
+    ENCODER = tiktoken.encoding_for_model(EMBED_MODEL)
+except KeyError:
+    ENCODER = tiktoken.get_encoding("cl100k_base")
+
+
+async def embed_texts(texts: List[str], sem: asyncio.Semaphore) -> List[np.ndarray]:
+    """Embed texts in concurrent, size-bounded requests; results keep input order."""
+    texts, token_counts = truncate_texts(ENCODER, texts, EMBED_MAX_INPUT_TOKENS)
+    vectors: List[np.ndarray] = [None] * len(texts)  # type: ignore[list-item]
+
+    async def run(batch: List[int]) -> None:
+        async with sem:
+            # base64 keeps the SDK from decoding each vector into a list of Python floats
+            resp = await client.embeddings.create(
+                model=EMBED_MODEL, input=[texts[i] for i in batch], encoding_format="base64"
+            )
+        # OpenAI returns embeddings in the same order as input
+        for i, d in zip(batch, resp.data):
+            vectors[i] = np.frombuffer(base64.b64decode(d.embedding), dtype="<f4")
+
+    await asyncio.gather(*(run(batch) for batch in pack_batches(
+        token_counts, EMBED_MAX_INPUTS_PER_REQUEST, EMBED_MAX_TOKENS_PER_REQUEST
+    )))
+    return vectors
 
 
-def item_to_text(item: Dict[str, Any]) -> str:
+async def fetch_cached_embeddings(conn, digests: List[bytes]) -> Dict[bytes, Any]:
     """
-    Build a stable, compact 'document' string for embeddings.
-    Keep it consistent across runs so vector meaning stays comparable.
+    Look up embeddings by SHA-256 of the doc text in the embedding_cache table
+    shared with the RAG service, so re-runs never re-pay for identical texts.
     """
-    parts = [
-        f"name: {item.get('name','')}",
-        f"store: {item.get('store','')}",
-        f"category: {item.get('category_path','')}",
-        f"unit_size: {item.get('unit_size','')}",
-        f"price: {item.get('price','')}",
-    ]
-
-    # Optional fields if present in your schema
-    if item.get("tags_json") is not None:
-        parts.append(f"tags: {json.dumps(item.get('tags_json'), ensure_ascii=False)}")
-    if item.get("raw_json") is not None:
-        # raw_json can be huge; include only if you really want it
-        pass
-
-    return "\n".join(parts).strip()
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "SELECT text_sha, embedding FROM embedding_cache WHERE model = %s AND text_sha = ANY(%s::bytea[])",
+            (EMBED_MODEL, digests),
+            binary=True,
+        )
+        return {bytes(r["text_sha"]): r["embedding"] for r in await cur.fetchall()}
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
-    # OpenAI returns embeddings in the same order as input
-    return [d.embedding for d in resp.data]
+async def store_cached_embeddings(conn, entries: List[Tuple[bytes, Any]]) -> None:
+    async with conn.cursor() as cur:
+        await cur.executemany(
+            """
+            INSERT INTO embedding_cache (model, text_sha, embedding)
+            VALUES (%s, %s, %b)
+            ON CONFLICT (model, text_sha) DO NOTHING
+            """,
+            [(EMBED_MODEL, digest, vec) for digest, vec in entries],
+        )
 
 
-def fetch_items_missing_embeddings(conn, limit: int, store: str | None) -> List[Dict[str, Any]]:
+async def fetch_items_missing_embeddings(conn, limit: int, store: str | None, after_id: int = 0) -> List[Dict[str, Any]]:
     """
-    Pull items that don't have an embedding row yet.
+    Pull items that don't have an embedding row yet, paging by id (keyset) so
+    the next page can be fetched before the current one has been upserted.
     """
     where_store = ""
-    params: List[Any] = []
+    params: List[Any] = [after_id]
     if store:
-        where_store = "AND i.store ILIKE %s"
+        where_store = "AND i.store_norm = lower(%s)"
         params.append(store)
 
     params.append(limit)
 
-    with conn.cursor() as cur:
-        cur.execute(
+    async with conn.cursor() as cur:
+        await cur.execute(
             f"""
             SELECT
               i.id,
-              i.store,
-              i.name,
-              i.category_path,
-              i.unit_size,
-              i.price,
-              i.tags_json
+              i.doc_text
             FROM items i
             LEFT JOIN item_embeddings e ON e.item_id = i.id
             WHERE e.item_id IS NULL
+              AND i.id > %s
               {where_store}
             ORDER BY i.id
             LIMIT %s
             """,
             params,
         )
-        return cur.fetchall()
+        return await cur.fetchall()
 
 
-def upsert_embeddings(conn, rows: List[Tuple[int, List[float]]]) -> None:
+async def upsert_embeddings(conn, rows: List[Tuple[int, List[float]]]) -> None:
     """
     rows: [(item_id, embedding_vector), ...]
+
+    Streams the batch into a temp table with binary COPY, then merges it into
+    item_embeddings with a single INSERT ... ON CONFLICT.
     """
     now = datetime.now(timezone.utc)
 
-    with conn.cursor() as cur:
-        for item_id, emb in rows:
-            cur.execute(
-                """
-                INSERT INTO item_embeddings (item_id, embedding, updated_at)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (item_id)
-                DO UPDATE SET embedding = EXCLUDED.embedding,
-                              updated_at = EXCLUDED.updated_at
-                """,
-                (item_id, emb, now),
-            )
-
-
-def main():
-    # Usage: python3 backfill_item_embeddings.py --store TRADER_JOES --limit 5000
-    import argparse
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS item_embeddings_stage "
+            "(item_id BIGINT, embedding vector) ON COMMIT DELETE ROWS"
+        )
+        async with cur.copy("COPY item_embeddings_stage (item_id, embedding) FROM STDIN WITH (FORMAT BINARY)") as copy:
+            copy.set_types(["int8", "vector"])
+            for item_id, emb in rows:
+                await copy.write_row((item_id, emb))
+        await cur.execute(
+            """
+            INSERT INTO item_embeddings (item_id, embedding, updated_at)
+            SELECT item_id, embedding, %s FROM item_embeddings_stage
+            ON CONFLICT (item_id)
+            DO UPDATE SET embedding = EXCLUDED.embedding,
+                          updated_at = EXCLUDED.updated_at
+            """,
+            (now,),
+        )
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--store", default=None, help="Optional store filter: TRADER_JOES or COSTCO")
-    parser.add_argument("--limit", type=int, default=5000, help="Max items to process in this run")
-    parser.add_argument("--chunk", type=int, default=BATCH_SIZE, help="Embedding batch size")
-    args = parser.parse_args()
 
+async def run(store: str | None, limit: int, chunk: int) -> int:
     processed = 0
+    sem = asyncio.Semaphore(EMBED_CONCURRENCY)
 
-    with psycopg.connect(DATABASE_URL, row_factory=dict_row) as conn:
-        register_vector(conn)
+    async with await psycopg.AsyncConnection.connect(DATABASE_URL, row_factory=dict_row) as conn:
+        await register_vector_async(conn)
 
-        pbar = tqdm(total=args.limit, desc="Embedding items", unit="item")
-        while processed < args.limit:
-            batch_items = fetch_items_missing_embeddings(conn, limit=args.chunk, store=args.store)
+        pbar = tqdm(total=limit, desc="Embedding items", unit="item")
+        next_page = asyncio.create_task(
+            fetch_items_missing_embeddings(conn, limit=min(chunk, limit), store=store)
+        )
+        while True:
+            batch_items = await next_page
             if not batch_items:
                 break
 
-            texts = [item_to_text(it) for it in batch_items]
-            vectors = embed_texts(texts)
+            # Prefetch the next page while this one is being embedded
+            remaining = limit - processed - len(batch_items)
+            if remaining > 0:
+                next_page = asyncio.create_task(fetch_items_missing_embeddings(
+                    conn, limit=min(chunk, remaining), store=store, after_id=batch_items[-1]["id"]
+                ))
+            else:
+                next_page = None
+
+            texts = [it["doc_text"] for it in batch_items]
+            digests = [hashlib.sha256(t.encode("utf-8")).digest() for t in texts]
+            cached = await fetch_cached_embeddings(conn, list(set(digests)))
 
-            upsert_rows = [(it["id"], vec) for it, vec in zip(batch_items, vectors)]
-            upsert_embeddings(conn, upsert_rows)
+            # Only texts not seen before (by content hash) go to the API
+            misses = list({d: i for i, d in enumerate(digests) if d not in cached}.values())
+            if misses:
+                fresh = await embed_texts([texts[i] for i in misses], sem)
+                entries = [(digests[i], vec) for i, vec in zip(misses, fresh)]
+                await store_cached_embeddings(conn, entries)
+                cached.update(entries)
 
-            conn.commit()
+            upsert_rows = [(it["id"], cached[d]) for it, d in zip(batch_items, digests)]
+            await upsert_embeddings(conn, upsert_rows)
+
+            await conn.commit()
 
             processed += len(batch_items)
             pbar.update(len(batch_items))
+            if next_page is None:
+                break
 
         pbar.close()
 
+    return processed
+
+
+def main():
+    # Usage (from the repo root): PYTHONPATH=rag python3 scripts/backfill_item_embeddings.py --store TRADER_JOES --limit 5000
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default=None, help="Optional store filter: TRADER_JOES or COSTCO")
+    parser.add_argument("--limit", type=int, default=5000, help="Max items to process in this run")
+    parser.add_argument("--chunk", type=int, default=BATCH_SIZE, help="Items fetched and embedded per DB batch")
+    args = parser.parse_args()
+
+    processed = asyncio.run(run(args.store, args.limit, args.chunk))
+
     print(f"Done. Embedded {processed} items (store={args.store}).")
 
 
@@ -2,15 +2,20 @@ import json
 import os
 import psycopg2
 import psycopg2.extras
+from psycopg2.extras import Json
+
+from json_stream import iter_json_array
 
 TJ_BASE = "https://www.traderjoes.com"
 
-UPSERT_ITEM_SQL = """
+# Multi-row statements for psycopg2.extras.execute_values: each page of rows is
+# sent as one INSERT ... VALUES (...), (...) that Postgres parses and plans once.
+# A single statement may not touch the same conflict key twice, so rows are
+# deduplicated before they are sent.
+UPSERT_ITEMS_SQL = """
 INSERT INTO items
   (store, name, external_id, price, unit_size, category_path, image_url, tags_json, raw_json)
-VALUES
-  (%(store)s, %(name)s, %(external_id)s, %(price)s, %(unit_size)s, %(category_path)s,
-   %(image_url)s, %(tags_json)s::jsonb, %(raw_json)s::jsonb)
+VALUES %s
 ON CONFLICT (store, external_id)
 DO UPDATE SET
   name = EXCLUDED.name,
@@ -20,14 +25,18 @@ DO UPDATE SET
   image_url = EXCLUDED.image_url,
   tags_json = EXCLUDED.tags_json,
   raw_json = EXCLUDED.raw_json
-RETURNING id
+RETURNING id, store, external_id
 """
 
+UPSERT_ITEMS_TEMPLATE = (
+    "(%(store)s, %(name)s, %(external_id)s, %(price)s, %(unit_size)s, %(category_path)s,"
+    " %(image_url)s, %(tags_json)s, %(raw_json)s)"
+)
+
 UPSERT_NUTRITION_SQL = """
 INSERT INTO item_nutrition
   (item_id, nutrition, updated_at)
-VALUES
-  (%(item_id)s, %(nutrition)s, CURRENT_TIMESTAMP)
+VALUES %s
 ON CONFLICT (item_id)
 DO UPDATE SET
   nutrition = EXCLUDED.nutrition,
@@ -37,14 +46,17 @@ DO UPDATE SET
 UPSERT_INGREDIENTS_SQL = """
 INSERT INTO item_ingredients
   (item_id, ingredients, updated_at)
-VALUES
-  (%(item_id)s, %(ingredients)s, CURRENT_TIMESTAMP)
+VALUES %s
 ON CONFLICT (item_id)
 DO UPDATE SET
   ingredients = EXCLUDED.ingredients,
   updated_at = CURRENT_TIMESTAMP
 """
 
+DETAIL_TEMPLATE = "(%s, %s, CURRENT_TIMESTAMP)"
+
+PAGE_SIZE = 1000
+
 def to_abs_url(path: str | None) -> str | None:
     if not path:
         return None
@@ -66,7 +78,7 @@ def get_image_url(raw: dict) -> str | None:
     image_path = pim.get("url") or raw.get("primary_image")
     return to_abs_url(image_path)
 
-def get_tags_json(raw: dict) -> str | None:
+def get_tags(raw: dict) -> list | None:
     tags = []
     fun_tags = raw.get("fun_tags") or []
     characteristics = raw.get("item_characteristics") or []
@@ -76,7 +88,7 @@ def get_tags_json(raw: dict) -> str | None:
     for t in characteristics:
         if isinstance(t, str) and t.strip():
             tags.append(t)
-    return json.dumps(tags) if tags else None
+    return tags or None
 
 def coerce_price(item: dict) -> float | None:
     p = item.get("price")
@@ -94,9 +106,11 @@ def coerce_price(item: dict) -> float | None:
 def load_parsed_data(nutrition_path: str, ingredients_path: str):
     """
     Load parsed nutrition and ingredients data and create SKU lookup dictionaries.
+    Values are the JSON text stored in item_nutrition/item_ingredients,
+    serialized once here rather than per imported row.
     
     Returns:
-        (nutrition_lookup, ingredients_lookup) - dictionaries keyed by SKU
+        (nutrition_lookup, ingredients_lookup) - dictionaries of SKU -> JSON string
     """
     nutrition_lookup = {}
     ingredients_lookup = {}
@@ -110,7 +124,10 @@ def load_parsed_data(nutrition_path: str, ingredients_path: str):
             for item in nutrition_data["parsed_items"]:
                 sku = item.get("sku")
                 if sku:
-                    nutrition_lookup[str(sku)] = item
+                    nutrition_lookup[str(sku)] = json.dumps({
+                        "parsed": item.get("nutrition_parsed"),
+                        "raw": item.get("nutrition_raw")
+                    }, ensure_ascii=False)
         print(f"✅ Loaded {len(nutrition_lookup)} parsed nutrition items from {nutrition_path}")
     else:
         print(f"⚠️  Nutrition parsed file not found: {nutrition_path}")
@@ -124,13 +141,105 @@ def load_parsed_data(nutrition_path: str, ingredients_path: str):
             for item in ingredients_data["parsed_items"]:
                 sku = item.get("sku")
                 if sku:
-                    ingredients_lookup[str(sku)] = item
+                    ingredients_lookup[str(sku)] = json.dumps({
+                        "parsed": item.get("ingredients_parsed"),
+                        "raw": item.get("ingredients_raw")
+                    }, ensure_ascii=False)
         print(f"✅ Loaded {len(ingredients_lookup)} parsed ingredients items from {ingredients_path}")
     else:
         print(f"⚠️  Ingredients parsed file not found: {ingredients_path}")
     
     return nutrition_lookup, ingredients_lookup
 
+def build_rows(item, nutrition_lookup: dict, ingredients_lookup: dict):
+    """
+    Map one scraped item to its (key, item_row, nutrition_text, ingredients_text),
+    or None when it lacks a SKU or name.
+    """
+    if not isinstance(item, dict):
+        return None
+
+    store = item.get("store") or "TRADER_JOES"
+    sku = item.get("sku")
+    name = item.get("name") or (item.get("raw") or {}).get("item_title")
+
+    if not sku or not name:
+        return None
+
+    raw = item.get("raw") or {}
+    sku_str = str(sku)
+
+    item_row = {
+        "store": store,
+        "name": name,
+        "external_id": sku_str,
+        "price": coerce_price(item),
+        "unit_size": get_unit_size(raw),
+        "category_path": item.get("categories"),
+        "image_url": get_image_url(raw),
+        # Json adapts to a jsonb literal; the target columns need no cast
+        "tags_json": Json(tags) if (tags := get_tags(raw)) else None,
+        "raw_json": Json(raw) if raw else None,
+    }
+
+    # Use the pre-serialized parsed data first, fall back to raw if not available
+    nutrition_text = nutrition_lookup.get(sku_str)
+
+    if nutrition_text is None:
+        # Fall back to raw nutrition text from original item
+        nutrition = item.get("nutrition")
+        if nutrition:
+            # Truncate if too long
+            if len(nutrition) > 10000:
+                nutrition = nutrition[:10000]
+            nutrition_text = nutrition
+
+    # Use the pre-serialized parsed data first, fall back to raw if not available
+    ingredients_text = ingredients_lookup.get(sku_str)
+
+    if ingredients_text is None:
+        # Fall back to raw ingredients text from original item
+        ingredients = item.get("ingredients")
+        if ingredients:
+            # Truncate if too long
+            if len(ingredients) > 5000:
+                ingredients = ingredients[:5000]
+            ingredients_text = ingredients
+
+    return (store, sku_str), item_row, nutrition_text, ingredients_text
+
+def flush_page(cur, page: dict) -> tuple[int, int, int]:
+    """
+    Upsert one page of rows (keyed by (store, external_id)) and their nutrition and
+    ingredients. Returns (items, nutrition, ingredients) upserted.
+    """
+    returned = psycopg2.extras.execute_values(
+        cur, UPSERT_ITEMS_SQL, [row for row, _, _ in page.values()],
+        template=UPSERT_ITEMS_TEMPLATE, page_size=PAGE_SIZE, fetch=True,
+    )
+    item_ids = {(store, external_id): item_id for item_id, store, external_id in returned}
+
+    nutrition_rows = []
+    ingredients_rows = []
+    for key, (_, nutrition_text, ingredients_text) in page.items():
+        item_id = item_ids.get(key)
+        if item_id is None:
+            continue
+        if nutrition_text:
+            nutrition_rows.append((item_id, nutrition_text))
+        if ingredients_text:
+            ingredients_rows.append((item_id, ingredients_text))
+
+    if nutrition_rows:
+        psycopg2.extras.execute_values(
+            cur, UPSERT_NUTRITION_SQL, nutrition_rows, template=DETAIL_TEMPLATE, page_size=PAGE_SIZE,
+        )
+    if ingredients_rows:
+        psycopg2.extras.execute_values(
+            cur, UPSERT_INGREDIENTS_SQL, ingredients_rows, template=DETAIL_TEMPLATE, page_size=PAGE_SIZE,
+        )
+    return len(item_ids), len(nutrition_rows), len(ingredients_rows)
+
 def main():
     # Update these or pass via env vars
     db_host = os.getenv("PGHOST", "localhost")
@@ -146,12 +255,6 @@ def main():
     # Load parsed data
     nutrition_lookup, ingredients_lookup = load_parsed_data(nutrition_parsed_path, ingredients_parsed_path)
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    if not isinstance(data, list):
-        raise ValueError("Expected a JSON array at the top level")
-
     conn = psycopg2.connect(
         host=db_host, port=db_port, dbname=db_name, user=db_user, password=db_pass
     )
@@ -162,129 +265,34 @@ def main():
     nutrition_upserted = 0
     ingredients_upserted = 0
 
+    # The whole load is one transaction; a crash just means re-running the import,
+    # so don't wait on the WAL flush at commit
     with conn.cursor() as cur:
-        nutrition_batch = []
-        ingredients_batch = []
-        
-        for item in data:
-            if not isinstance(item, dict):
-                skipped += 1
-                continue
-
-            store = item.get("store") or "TRADER_JOES"
-            sku = item.get("sku")
-            name = item.get("name") or (item.get("raw") or {}).get("item_title")
+        cur.execute("SET LOCAL synchronous_commit = off")
 
-            if not sku or not name:
+        # Items are streamed from the file and flushed a page at a time. Within a page a
+        # repeated SKU keeps its last occurrence (one INSERT cannot touch a key twice).
+        page = {}
+        for item in iter_json_array(json_path):
+            built = build_rows(item, nutrition_lookup, ingredients_lookup)
+            if built is None:
                 skipped += 1
                 continue
+            key, item_row, nutrition_text, ingredients_text = built
+            page[key] = (item_row, nutrition_text, ingredients_text)
 
-            raw = item.get("raw") or {}
-
-            # Upsert item and get the item_id
-            row = {
-                "store": store,
-                "name": name,
-                "external_id": str(sku),
-                "price": coerce_price(item),
-                "unit_size": get_unit_size(raw),
-                "category_path": item.get("categories"),
-                "image_url": get_image_url(raw),
-                "tags_json": get_tags_json(raw),
-                "raw_json": json.dumps(raw) if raw else None,
-            }
-            
-            # Insert/update item and get the item_id
-            cur.execute(UPSERT_ITEM_SQL, row)
-            result = cur.fetchone()
-            if not result:
-                skipped += 1
-                continue
-            item_id = result[0]
-            
-            # Try to get parsed nutrition data first, fall back to raw if not available
-            sku_str = str(sku)
-            nutrition_text = None
-            
-            if sku_str in nutrition_lookup:
-                # Use parsed data - store as JSON string
-                parsed_item = nutrition_lookup[sku_str]
-                nutrition_data = {
-                    "parsed": parsed_item.get("nutrition_parsed"),
-                    "raw": parsed_item.get("nutrition_raw")
-                }
-                nutrition_text = json.dumps(nutrition_data, ensure_ascii=False)
-            else:
-                # Fall back to raw nutrition text from original item
-                nutrition = item.get("nutrition")
-                if nutrition:
-                    # Truncate if too long
-                    if len(nutrition) > 10000:
-                        nutrition = nutrition[:10000]
-                    nutrition_text = nutrition
-            
-            # Add nutrition to batch if available
-            if nutrition_text:
-                nutrition_row = {
-                    "item_id": item_id,
-                    "nutrition": nutrition_text,
-                }
-                nutrition_batch.append(nutrition_row)
-                
-                # Flush nutrition batch in chunks
-                if len(nutrition_batch) >= 500:
-                    psycopg2.extras.execute_batch(cur, UPSERT_NUTRITION_SQL, nutrition_batch, page_size=500)
-                    nutrition_upserted += len(nutrition_batch)
-                    nutrition_batch.clear()
-            
-            # Try to get parsed ingredients data first, fall back to raw if not available
-            ingredients_text = None
-            
-            if sku_str in ingredients_lookup:
-                # Use parsed data - store as JSON string
-                parsed_item = ingredients_lookup[sku_str]
-                ingredients_data = {
-                    "parsed": parsed_item.get("ingredients_parsed"),
-                    "raw": parsed_item.get("ingredients_raw")
-                }
-                ingredients_text = json.dumps(ingredients_data, ensure_ascii=False)
-            else:
-                # Fall back to raw ingredients text from original item
-                ingredients = item.get("ingredients")
-                if ingredients:
-                    # Truncate if too long
-                    if len(ingredients) > 5000:
-                        ingredients = ingredients[:5000]
-                    ingredients_text = ingredients
-            
-            # Add ingredients to batch if available
-            if ingredients_text:
-                ingredients_row = {
-                    "item_id": item_id,
-                    "ingredients": ingredients_text,
-                }
-                ingredients_batch.append(ingredients_row)
-                
-                # Flush ingredients batch in chunks
-                if len(ingredients_batch) >= 500:
-                    psycopg2.extras.execute_batch(cur, UPSERT_INGREDIENTS_SQL, ingredients_batch, page_size=500)
-                    ingredients_upserted += len(ingredients_batch)
-                    ingredients_batch.clear()
-            
-            upserted += 1
-            
-            # Commit periodically to avoid long transactions
-            if upserted % 1000 == 0:
-                conn.commit()
-
-        # Flush remaining batches
-        if nutrition_batch:
-            psycopg2.extras.execute_batch(cur, UPSERT_NUTRITION_SQL, nutrition_batch, page_size=500)
-            nutrition_upserted += len(nutrition_batch)
-        
-        if ingredients_batch:
-            psycopg2.extras.execute_batch(cur, UPSERT_INGREDIENTS_SQL, ingredients_batch, page_size=500)
-            ingredients_upserted += len(ingredients_batch)
+            if len(page) >= PAGE_SIZE:
+                counts = flush_page(cur, page)
+                upserted += counts[0]
+                nutrition_upserted += counts[1]
+                ingredients_upserted += counts[2]
+                page.clear()
+
+        if page:
+            counts = flush_page(cur, page)
+            upserted += counts[0]
+            nutrition_upserted += counts[1]
+            ingredients_upserted += counts[2]
 
     conn.commit()
     conn.close()
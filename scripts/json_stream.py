@@ -0,0 +1,159 @@
+"""
+Streaming helpers for the large JSON files (tj-items.json and the parsed
+outputs) handled by the parse scripts and import_tj.py, using only the standard
+library. The deploy workflow copies this file to EC2 next to import_tj.py.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator
+
+try:
+    # Optional: orjson encodes in C even with indentation; the stdlib encoder
+    # falls back to pure Python whenever indent is set
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Same whitespace rule as the json module's decoder
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters that can continue a number cut at the end of a chunk
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+def iter_json_array(path: str, chunk_size: int = 4 << 20) -> Iterator[Any]:
+    """
+    Yield the elements of a top-level JSON array one at a time, reading the file
+    in chunks so peak memory is bounded by one chunk plus one element rather
+    than the whole document.
+
+    The file is read unbuffered in binary, one read per chunk, and decoded
+    incrementally (a chunk may end mid-character), skipping the extra copies
+    of the buffered text layer. Larger chunks also mean fewer elements cut at
+    a chunk boundary, which are decoded twice.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb", buffering=0) as f:
+
+        def read_chunk():
+            data = f.read(chunk_size)
+            return utf8.decode(data, final=not data), not data
+
+        buf, eof = read_chunk()
+        pos = _WHITESPACE.match(buf, 0).end()
+        while pos >= len(buf) and not eof:
+            chunk, eof = read_chunk()
+            buf += chunk
+            pos = _WHITESPACE.match(buf, 0).end()
+        if pos >= len(buf) or buf[pos] != "[":
+            raise ValueError("Expected a JSON array at the top level")
+        pos += 1
+
+        # As strict as json.load: exactly one "," between elements, none before
+        # the first element or before "]", and nothing but whitespace after "]"
+        first = True
+        expect_value = True
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                char = buf[pos]
+                if not expect_value:
+                    if char == "]":
+                        break
+                    if char != ",":
+                        raise ValueError(f"Expected ',' or ']' after array element, got {char!r}")
+                    pos += 1
+                    expect_value = True
+                    continue
+                if char == "]" and first:
+                    break
+                if char in ",]":
+                    raise ValueError(f"Expected an array element, got {char!r}")
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    # A number at the buffer edge may be cut short ("2" of "25", or
+                    # "2" of "2.5" cut after the "."), so only trust a value once
+                    # something other than a number's continuation follows it
+                    if eof or _NUMBER_TAIL.match(buf, end).end() < len(buf):
+                        yield value
+                        pos = end
+                        first = expect_value = False
+                        continue
+            elif eof:
+                raise ValueError("Unterminated JSON array")
+
+            # Need more input: drop the consumed prefix and append the next chunk
+            chunk, eof = read_chunk()
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        pos += 1
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                raise ValueError("Extra data after the top-level JSON array")
+            if eof:
+                return
+            buf, eof = read_chunk()
+            pos = 0
+
+
+def _dumps_indented(value: Any, level: int) -> str:
+    """Encode value as json.dumps(indent=2, ensure_ascii=False) would, nested `level` deep."""
+    text = None
+    if orjson is not None:
+        try:
+            text = orjson.dumps(value, option=orjson.OPT_INDENT_2).decode("utf-8")
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib handles those
+    if text is None:
+        text = json.dumps(value, indent=2, ensure_ascii=False)
+    # Newlines only occur between tokens (they are escaped inside strings)
+    return text.replace("\n", "\n" + "  " * level)
+
+
+def iter_jsonl(path: str) -> Iterator[Any]:
+    """Yield the records of a JSON Lines file one at a time."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def dump_json(obj: Dict[str, Any], path: str) -> None:
+    """
+    Write obj to path in the same format as json.dump(obj, f, indent=2,
+    ensure_ascii=False), but encode list values one element at a time into a
+    buffered file, so the output is never built as one string in memory.
+    Values may also be iterators (e.g. iter_jsonl), written as arrays as they
+    are consumed.
+    """
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        if not obj:
+            f.write("{}")
+            return
+        for i, (key, value) in enumerate(obj.items()):
+            f.write(",\n  " if i else "{\n  ")
+            f.write(json.dumps(key, ensure_ascii=False) + ": ")
+            if isinstance(value, (list, Iterator)):
+                _write_array(f, value)
+            else:
+                f.write(_dumps_indented(value, 1))
+        f.write("\n}")
+
+
+def _write_array(f, elements: Iterable[Any]) -> None:
+    """Write an array value of dump_json, one element at a time."""
+    empty = True
+    for element in elements:
+        f.write("[\n    " if empty else ",\n    ")
+        f.write(_dumps_indented(element, 2))
+        empty = False
+    f.write("[]" if empty else "\n  ]")
@@ -12,9 +12,49 @@ And extracts structured fields like:
 - ingredients_count (number of main ingredients)
 """
 
+import contextlib
+import functools
 import json
+import multiprocessing
+import os
 import re
-from typing import Dict, Optional, Any, List
+import sys
+from typing import Dict, Iterator, Optional, Any, List, Tuple
+
+from json_stream import dump_json, iter_json_array, iter_jsonl
+
+
+# Head of a "CONTAINS X% OR LESS OF ..." clause. The clause itself runs to the
+# end of the section, so it is sliced off by position rather than matched with
+# a lazy ".+?" that tests an end-of-section lookahead at every character. The
+# uppercase pattern runs over the section uppercased once rather than folding
+# case in the engine; the IGNORECASE copy is only for the rare text whose
+# uppercase form changes length (e.g. "ß" -> "SS"), where match positions would
+# not line up with the original.
+_CONTAINS_PATTERN = r',?\s*CONTAINS\s+(\d+(?:\.\d+)?)\s*%\s*OR\s*LESS\s+OF\s+'
+_RE_CONTAINS = re.compile(_CONTAINS_PATTERN)
+_RE_CONTAINS_ANYCASE = re.compile(_CONTAINS_PATTERN, re.IGNORECASE)
+
+# The scanners below only visit these characters; the regex engine skips the
+# runs of ingredient text between them in C rather than a Python loop per char
+_RE_DELIMITERS = re.compile(r"[(),]")
+# _tokenize also stops at a period that ends a sentence (followed by whitespace
+# or the end of the section), e.g. "BAKING POWDER (...). *ORGANIC"
+_RE_TOKENS = re.compile(r"[(),]|\.(?=\s|$)")
+
+# Text after a sentence-ending period that starts a footnote or allergen
+# statement rather than more ingredients; the rest of the section is dropped
+_FOOTNOTE_MARKERS = ("*", "†", "‡")
+_STATEMENT_PREFIXES = ("MAY CONTAIN", "CONTAINS ")
+
+# Characters that splitting always discards (periods and parentheses can survive
+# into a name in malformed text, so they are not included)
+_SEPARATOR_CHARS = " \t\r\n,;:"
+
+
+# Distinct texts whose parse results are kept per process; the same ingredients
+# text often appears on several SKUs (e.g. sizes of one product)
+PARSE_CACHE_SIZE = 8192
 
 
 def parse_ingredients_text(ingredients_text: str) -> Optional[Dict[str, Any]]:
@@ -22,22 +62,47 @@ def parse_ingredients_text(ingredients_text: str) -> Optional[Dict[str, Any]]:
     Parse unstructured ingredients text into structured data.
     
     Returns a dictionary with parsed ingredients, or None if parsing fails.
+    Results are memoized by text; each call returns its own copy.
     """
     if not ingredients_text or not isinstance(ingredients_text, str):
         return None
     
+    parsed = _parse_ingredients_cached(ingredients_text)
+    return _copy_parsed(parsed) if parsed is not None else None
+
+
+def _copy_parsed(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a cached result down to the ingredient dicts (cheaper than deepcopy)."""
+    copied = dict(parsed)
+    copied["ingredients_list"] = [dict(ing) for ing in parsed["ingredients_list"]]
+    if "contains_less_than" in parsed:
+        copied["contains_less_than"] = [
+            {**clause, "ingredients": [dict(ing) for ing in clause["ingredients"]]}
+            for clause in parsed["contains_less_than"]
+        ]
+    return copied
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_ingredients_cached(ingredients_text: str) -> Optional[Dict[str, Any]]:
+    """parse_ingredients_text without the copy; callers must not mutate the result."""
     # Clean up the text
     text = ingredients_text.strip()
     if not text:
         return None
     
+    # Quick reject: text made only of separators (e.g. ",;" or ": ,") cannot
+    # yield an ingredient name
+    if not text.strip(_SEPARATOR_CHARS):
+        return None
+    
     result: Dict[str, Any] = {
         "ingredients_raw": text,
     }
     
     # Split by common separators (colon, semicolon) for multi-section ingredients
     # e.g., "SALAMI: PORK, SALT. CHEESE: MILK, SALT."
-    sections = re.split(r'[;:]', text)
+    sections = text.replace(";", ":").split(":")
     
     all_ingredients = []
     contains_less_than = []
@@ -50,16 +115,22 @@ def parse_ingredients_text(ingredients_text: str) -> Optional[Dict[str, Any]]:
         # Check for "CONTAINS X% OR LESS OF" pattern
         # This pattern can appear in the middle of a comma-separated list
         # e.g., "PORK, SALT, CONTAINS 2% OR LESS OF X, Y, Z."
-        # We need to capture everything from "CONTAINS" to the end of the string or a period
-        contains_match = re.search(
-            r',?\s*CONTAINS\s+(\d+(?:\.\d+)?)\s*%\s*OR\s*LESS\s+OF\s+(.+?)(?=\.\s*$|$)',
-            section,
-            re.IGNORECASE | re.DOTALL
-        )
+        # We need to capture everything from "CONTAINS" to the end of the section,
+        # less a final period
+        section_upper = section.upper()
+        if len(section_upper) == len(section):
+            contains_match = _RE_CONTAINS.search(section_upper)
+        else:
+            contains_match = _RE_CONTAINS_ANYCASE.search(section)
         
         if contains_match:
             percentage = contains_match.group(1)
-            ingredients_part = contains_match.group(2).strip()
+            # Positions line up with the original, whose case is kept
+            start = contains_match.end()
+            end = len(section)
+            if section.endswith(".") and end - 1 > start:
+                end -= 1
+            ingredients_part = section[start:end].strip()
             
             # Remove trailing period if present
             ingredients_part = ingredients_part.rstrip('.')
@@ -72,45 +143,35 @@ def parse_ingredients_text(ingredients_text: str) -> Optional[Dict[str, Any]]:
                 "ingredients": less_than_ingredients
             })
             
-            # Remove this entire "CONTAINS X% OR LESS OF ..." part from the section
-            # This removes everything from the comma before "CONTAINS" to the end
-            section = re.sub(
-                r',?\s*CONTAINS\s+\d+(?:\.\d+)?\s*%\s*OR\s*LESS\s+OF\s+.*$',
-                '',
-                section,
-                flags=re.IGNORECASE | re.DOTALL
-            ).strip()
+            # Remove this entire "CONTAINS X% OR LESS OF ..." part from the section:
+            # the clause runs from the match start (the comma before "CONTAINS") to the end
+            section = section[:contains_match.start()].strip()
             
             # Also remove any trailing comma
             section = section.rstrip(',').strip()
         
-        # Handle parentheses (sub-ingredients)
+        # Walk the section once: top-level ingredients, each with the text of its
+        # parenthesized groups (sub-ingredients)
         # e.g., "RICE (WATER, RICE)" -> main: "RICE", sub: ["WATER", "RICE"]
-        paren_match = re.search(r'^([^(]+)\s*\(([^)]+)\)', section)
-        if paren_match:
-            main_part = paren_match.group(1).strip()
-            sub_part = paren_match.group(2).strip()
-            
-            # Add main ingredient
-            main_ingredients = split_ingredients(main_part)
-            all_ingredients.extend(main_ingredients)
+        for main_text, groups in _tokenize(section):
+            # Collapse the gap left where a group was cut out ("A (B) D" -> "A D")
+            # Interned: it is repeated as the parent of each sub-ingredient
+            main_name = sys.intern(_clean_part(" ".join(main_text.split())))
+            if main_name:
+                all_ingredients.append({"name": main_name})
             
             # Add sub-ingredients with indication they're nested
-            sub_ingredients = split_ingredients(sub_part)
-            for sub in sub_ingredients:
-                all_ingredients.append({
-                    "name": sub["name"],
-                    "is_sub_ingredient": True,
-                    "parent": main_ingredients[-1]["name"] if main_ingredients else None
-                })
-        else:
-            # No parentheses, just split by comma
-            ingredients = split_ingredients(section)
-            all_ingredients.extend(ingredients)
+            for group in groups:
+                for sub in split_ingredients(group):
+                    all_ingredients.append({
+                        "name": sub["name"],
+                        "is_sub_ingredient": True,
+                        "parent": main_name or None
+                    })
     
-    # Clean up and normalize ingredients
-    cleaned_ingredients = []
-    seen = set()
+    # Clean up and normalize ingredients, keyed by the uppercased name so the
+    # dict both drops duplicates and keeps first-seen order
+    cleaned: Dict[str, Dict[str, Any]] = {}
     
     for ing in all_ingredients:
         if isinstance(ing, dict):
@@ -122,21 +183,24 @@ def parse_ingredients_text(ingredients_text: str) -> Optional[Dict[str, Any]]:
             continue
         
         # Normalize: remove extra whitespace, handle common variations
-        name = re.sub(r'\s+', ' ', name)
+        name = " ".join(name.split())
         name = name.upper()  # Normalize to uppercase for consistency
+        # Names like SALT and WATER recur across thousands of items; interning
+        # keeps one copy of each (pickle also sends repeats from a worker as
+        # references) and makes the dedup lookups below identity hits
+        name = sys.intern(name)
         
-        # Skip duplicates (case-insensitive)
-        name_lower = name.lower()
-        if name_lower in seen:
+        # Skip duplicates (case-insensitive, as names are already uppercase)
+        if name in cleaned:
             continue
-        seen.add(name_lower)
         
         if isinstance(ing, dict):
             ing["name"] = name
-            cleaned_ingredients.append(ing)
+            cleaned[name] = ing
         else:
-            cleaned_ingredients.append({"name": name})
+            cleaned[name] = {"name": name}
     
+    cleaned_ingredients = list(cleaned.values())
     result["ingredients_list"] = cleaned_ingredients
     result["ingredients_count"] = len(cleaned_ingredients)
     
@@ -150,6 +214,38 @@ def parse_ingredients_text(ingredients_text: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+def _split_top_level_commas(text: str) -> List[str]:
+    """
+    Split on commas that are not inside parentheses, i.e. whose next parenthesis
+    is not a ")" (same rule as the regex lookahead split it replaces). Only the
+    delimiter positions are visited: commas are held until the next parenthesis
+    decides them, instead of a lookahead that re-scans the rest of the string at
+    every comma.
+    """
+    if "(" not in text and ")" not in text:
+        return text.split(",")
+    
+    cuts = []
+    pending = []
+    for match in _RE_DELIMITERS.finditer(text):
+        c = match.group()
+        if c == ",":
+            pending.append(match.start())
+        else:
+            if c == "(":
+                cuts.extend(pending)
+            pending = []
+    cuts.extend(pending)
+    
+    parts = []
+    start = 0
+    for i in cuts:
+        parts.append(text[start:i])
+        start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
 def split_ingredients(text: str) -> List[Dict[str, Any]]:
     """
     Split a comma-separated ingredient list into individual ingredients.
@@ -159,97 +255,244 @@ def split_ingredients(text: str) -> List[Dict[str, Any]]:
     if not text:
         return []
     
-    # Split by comma, but be careful with nested structures
-    # Simple approach: split by comma and clean each part
-    parts = re.split(r',\s*(?![^(]*\))', text)  # Don't split inside parentheses
+    # Split by comma, but don't split inside parentheses
+    parts = _split_top_level_commas(text)
     
     ingredients = []
     for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-        
-        # Remove trailing periods
-        part = part.rstrip('.')
-        
-        # Remove common prefixes/suffixes that aren't part of the ingredient name
-        part = re.sub(r'^(AND|OR)\s+', '', part, flags=re.IGNORECASE)
-        
+        part = _clean_part(part)
         if part:
             ingredients.append({
-                "name": part.strip()
+                "name": part
             })
     
     return ingredients
 
 
-def parse_json_file(input_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
+def _clean_part(part: str) -> str:
+    """Strip whitespace, trailing periods and a leading "AND "/"OR " from one ingredient."""
+    part = part.strip()
+    
+    # Remove trailing periods
+    part = part.rstrip('.')
+    
+    # Remove common prefixes that aren't part of the ingredient name
+    head = part[:3].upper()
+    for word in ("AND", "OR"):
+        n = len(word)
+        if head.startswith(word) and part[n:n + 1].isspace():
+            part = part[n:]
+            break
+    
+    return part.strip()
+
+
+def _tokenize(section: str) -> List[Tuple[str, List[str]]]:
+    """
+    Segment a section into top-level ingredients in one pass over its
+    delimiters, tracking parenthesis depth. Returns (text outside parentheses, [text of each
+    top-level parenthesized group]) per comma-separated ingredient, e.g.
+    "FLOUR (WHEAT, NIACIN), WATER" -> [("FLOUR ", ["WHEAT, NIACIN"]), (" WATER", [])].
+    Nested groups stay inside their parent group's text; an unclosed group
+    runs to the end of the section and a stray ")" is ignored.
+    
+    A sentence-ending period outside parentheses also ends an ingredient
+    ("CILANTRO. SOUTHWEST DRESSING" -> "CILANTRO", "SOUTHWEST DRESSING"), except
+    after a one-letter abbreviation ("L. CASEI"). When the next sentence is a
+    footnote ("*ORGANIC") or an allergen statement ("MAY CONTAIN SOY"), the
+    rest of the section is dropped.
+    """
+    if "(" not in section and "." not in section:
+        return [(part, []) for part in section.split(",")]
+    
+    entries: List[Tuple[str, List[str]]] = []
+    outside: List[str] = []
+    groups: List[str] = []
+    depth = 0
+    start = 0
+    for match in _RE_TOKENS.finditer(section):
+        i = match.start()
+        c = match.group()
+        if c == "(":
+            if depth == 0:
+                outside.append(section[start:i])
+                start = i + 1
+            depth += 1
+        elif c == ")":
+            if depth == 0:
+                continue
+            depth -= 1
+            if depth == 0:
+                groups.append(section[start:i])
+                start = i + 1
+        elif depth == 0:
+            if c == "." and _is_abbreviation(section, i):
+                continue
+            outside.append(section[start:i])
+            entries.append((" ".join(outside), groups))
+            outside, groups = [], []
+            start = i + 1
+            if c == ".":
+                rest = section[start:].lstrip()
+                if rest.startswith(_FOOTNOTE_MARKERS) or rest[:11].upper().startswith(_STATEMENT_PREFIXES):
+                    return entries
+    if depth:
+        groups.append(section[start:])
+    else:
+        outside.append(section[start:])
+    entries.append((" ".join(outside), groups))
+    return entries
+
+
+def _is_abbreviation(section: str, i: int) -> bool:
+    """Whether the period at i ends a one-letter abbreviation, e.g. "L." or "S."."""
+    return i >= 1 and section[i - 1].isalpha() and (i < 2 or not section[i - 2].isalnum())
+
+
+# Items handed to each worker process per task; large enough to amortize IPC
+PARSE_CHUNKSIZE = 256
+
+
+def _iter_jobs(items):
+    """Reduce each item to (idx, sku, name, ingredients text) so only those cross to workers."""
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            yield None
+            continue
+        yield (idx, item.get("sku", f"unknown_{idx}"), item.get("name", "Unknown"), item.get("ingredients"))
+
+
+def _parse_job(job):
+    """
+    Parse one item (runs in a worker process). Returns ("parsed" | "error" |
+    "missing", record), or None for entries that are not objects.
+    """
+    if job is None:
+        return None
+    idx, sku, name, ingredients_text = job
+    
+    if not ingredients_text:
+        return "missing", {"sku": sku, "name": name}
+    
+    parsed = parse_ingredients_text(ingredients_text)
+    
+    if parsed:
+        return "parsed", {
+            "sku": sku,
+            "name": name,
+            "ingredients_parsed": parsed,
+            "ingredients_raw": ingredients_text  # Keep original for reference
+        }
+    return "error", {
+        "sku": sku,
+        "name": name,
+        "ingredients_text": ingredients_text[:200]  # First 200 chars for debugging
+    }
+
+
+def _iter_parsed(input_path: str) -> Iterator[Optional[Tuple[str, Dict[str, Any]]]]:
+    """
+    Yield _parse_job's result for each entry of the input file, in input order.
+    Items are decoded one at a time rather than loading the whole file and
+    parsed across worker processes; imap keeps results in input order.
+    """
+    jobs = _iter_jobs(iter_json_array(input_path))
+    workers = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            yield from pool.imap(_parse_job, jobs, chunksize=PARSE_CHUNKSIZE)
+    else:
+        yield from map(_parse_job, jobs)
+
+
+def parse_json_file(input_path: str, output_path: Optional[str] = None, stream_only: bool = False) -> Dict[str, Any]:
     """
     Parse ingredients data from tj-items.json and create structured output.
     
     Args:
         input_path: Path to input JSON file
         output_path: Optional path to save parsed results. If None, prints summary.
+        stream_only: Keep no records in memory: every record is spilled to disk
+            as it is parsed and the output is assembled from the spill files.
+            Requires output_path.
     
     Returns:
-        Dictionary with parsing statistics and sample results
+        Dictionary with parsing statistics and sample results, or only the
+        summary with stream_only. With output_path set, parse errors are
+        written to "<output_path>.errors.jsonl" as they occur instead of being
+        held in memory, and "parse_errors" iterates over that file.
     """
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if stream_only and not output_path:
+        raise ValueError("stream_only requires an output_path")
     
-    if not isinstance(data, list):
-        raise ValueError("Expected a JSON array at the top level")
+    # Records of a kind with a spill path are appended to that JSON Lines file
+    # (and read back when the output is written) instead of a list. The errors
+    # file is kept; the others are temporary.
+    spill_paths: Dict[str, str] = {}
+    if output_path:
+        spill_paths["error"] = f"{output_path}.errors.jsonl"
+    if stream_only:
+        spill_paths["parsed"] = f"{output_path}.parsed.jsonl.tmp"
+        spill_paths["missing"] = f"{output_path}.missing.jsonl.tmp"
     
-    parsed_items = []
-    parse_errors = []
-    items_without_ingredients = []
+    total_items = 0
+    counts = {"parsed": 0, "error": 0, "missing": 0}
+    kept: Dict[str, List[Dict[str, Any]]] = {"parsed": [], "error": [], "missing": []}
+    with contextlib.ExitStack() as stack:
+        spills = {
+            kind: stack.enter_context(open(path, "w", encoding="utf-8"))
+            for kind, path in spill_paths.items()
+        }
+        for outcome in _iter_parsed(input_path):
+            total_items += 1
+            if outcome is None:
+                continue
+            kind, record = outcome
+            counts[kind] += 1
+            if kind in spills:
+                spills[kind].write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                if kind == "parsed":
+                    # Strings unpickled from a worker are fresh copies; re-intern
+                    # the names so the retained list shares one object per name
+                    for ing in record["ingredients_parsed"]["ingredients_list"]:
+                        ing["name"] = sys.intern(ing["name"])
+                        if ing.get("parent"):
+                            ing["parent"] = sys.intern(ing["parent"])
+                kept[kind].append(record)
     
-    for idx, item in enumerate(data):
-        if not isinstance(item, dict):
-            continue
-        
-        sku = item.get("sku", f"unknown_{idx}")
-        name = item.get("name", "Unknown")
-        ingredients_text = item.get("ingredients")
-        
-        if not ingredients_text:
-            items_without_ingredients.append({"sku": sku, "name": name})
-            continue
-        
-        parsed = parse_ingredients_text(ingredients_text)
-        
-        if parsed:
-            parsed_items.append({
-                "sku": sku,
-                "name": name,
-                "ingredients_parsed": parsed,
-                "ingredients_raw": ingredients_text  # Keep original for reference
-            })
-        else:
-            parse_errors.append({
-                "sku": sku,
-                "name": name,
-                "ingredients_text": ingredients_text[:200]  # First 200 chars for debugging
-            })
+    def records(kind):
+        return iter_jsonl(spill_paths[kind]) if kind in spill_paths else kept[kind]
     
+    summary = {
+        "total_items": total_items,
+        "items_with_ingredients_text": total_items - counts["missing"],
+        "successfully_parsed": counts["parsed"],
+        "parse_errors": counts["error"],
+        "items_without_ingredients": counts["missing"]
+    }
     result = {
-        "summary": {
-            "total_items": len(data),
-            "items_with_ingredients_text": len(data) - len(items_without_ingredients),
-            "successfully_parsed": len(parsed_items),
-            "parse_errors": len(parse_errors),
-            "items_without_ingredients": len(items_without_ingredients)
-        },
-        "parsed_items": parsed_items,
-        "parse_errors": parse_errors,  # All parse errors included
-        "items_without_ingredients": items_without_ingredients  # All items without ingredients included
+        "summary": summary,
+        "parsed_items": records("parsed"),
+        "parse_errors": records("error"),  # All parse errors included
+        "items_without_ingredients": records("missing")  # All items without ingredients included
     }
     
     if output_path:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        try:
+            dump_json(result, output_path)
+        finally:
+            for kind in ("parsed", "missing"):
+                if kind in spill_paths:
+                    os.remove(spill_paths[kind])
         print(f"✅ Parsed ingredients data saved to: {output_path}")
+        if stream_only:
+            return {"summary": summary}
+        result["parse_errors"] = records("error")  # dump_json consumed the first pass
     else:
+        parsed_items = kept["parsed"]
+        parse_errors = kept["error"]
+        
         # Print summary
         print("=" * 60)
         print("INGREDIENTS PARSING SUMMARY")
@@ -286,7 +529,8 @@ if __name__ == "__main__":
         output_file = sys.argv[2]
     
     try:
-        parse_json_file(input_file, output_file)
+        # Writing a file needs no records in memory, so stream them to disk
+        parse_json_file(input_file, output_file, stream_only=bool(output_file))
     except Exception as e:
         print(f"❌ Error: {e}", file=sys.stderr)
         import traceback
@@ -17,9 +17,103 @@ And extracts structured fields like:
 - vitamins and minerals
 """
 
+import bisect
+import contextlib
 import json
+import multiprocessing
+import os
 import re
-from typing import Dict, Optional, Any
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+
+from json_stream import dump_json, iter_json_array, iter_jsonl
+
+try:
+    # Optional: Google RE2 (pip install google-re2) matches in linear time without
+    # backtracking; the nutrient alternation below uses only RE2-compatible syntax
+    import re2
+except ImportError:
+    re2 = None
+
+
+# Patterns are compiled once at import rather than looked up in re's cache on
+# every call; parse_nutrition_text runs once per item. Patterns that only
+# capture numbers are lowercase and run over the text lowercased once, instead
+# of folding case inside the engine with IGNORECASE on every scan.
+_RE_NOTE = re.compile(r"NOTE:.*$", re.DOTALL | re.IGNORECASE)
+_RE_SERVES = re.compile(r"serves\s+(?:about\s+)?(\d+)")
+_RE_SERVING_SIZE = re.compile(r"serving\s+size\s*([^(]+)", re.IGNORECASE)  # keeps the text's case
+_RE_WEIGHT_GRAMS = re.compile(r"\((\d+(?:\.\d+)?)\s*g")
+_RE_CALORIES = re.compile(r"calories\s+per\s+serving\s*(\d+)")
+_RE_LESS_THAN = re.compile(r"(?:less\s*than|lessthan)\s*(\d+(?:\.\d+)?)")
+
+# (result field, label, unit) for each nutrient, matched against the lowercased
+# text. Words in a label may be separated by any whitespace. Note: no space
+# between nutrient name and number in some cases.
+_NUTRIENTS = (
+    # Macronutrients
+    ("total_fat_g", "total fat", "g"),
+    ("saturated_fat_g", "saturated fat", "g"),
+    ("trans_fat_g", "trans fat", "g"),
+    ("cholesterol_mg", "cholesterol", "mg"),
+    ("sodium_mg", "sodium", "mg"),
+    ("total_carbohydrate_g", "total carbohydrate", "g"),
+    ("dietary_fiber_g", "dietary fiber", "g"),
+    ("total_sugars_g", "total sugars", "g"),
+    ("added_sugars_g", "added sugars", "g"),
+    ("protein_g", "protein", "g"),
+    # Vitamins and minerals
+    ("vitamin_d_mcg", "vitamin d", "mcg"),
+    ("calcium_mg", "calcium", "mg"),
+    ("iron_mg", "iron", "mg"),
+    ("potassium_mg", "potassium", "mg"),
+)
+
+
+def _build_nutrient_regex():
+    """
+    One alternation over every nutrient, each value captured in a group named
+    after its result field, so a single left-to-right pass finds them all.
+    Labels are case-sensitive literals (the text is lowercased once instead of
+    using IGNORECASE), which lets the regex engine reject a branch on its first
+    character, and labels sharing a first word are factored into one branch
+    ("total" then fat | carbohydrate | sugars), trie style. Compiled with RE2
+    when it is installed, otherwise with re.
+    """
+    value = r"(?:less\s*than\s*|lessthan\s*)?[\d.]+"
+    by_first_word: Dict[str, list] = {}
+    for field, label, unit in _NUTRIENTS:
+        first, _, rest = label.partition(" ")
+        tail = "".join(r"\s+" + re.escape(word) for word in rest.split())
+        by_first_word.setdefault(first, []).append(
+            rf"{tail}\s*(?P<{field}>{value})\s*{unit}"
+        )
+    branches = [
+        re.escape(first) + (tails[0] if len(tails) == 1 else "(?:" + "|".join(tails) + ")")
+        for first, tails in by_first_word.items()
+    ]
+    return (re2 or re).compile("|".join(branches))
+
+
+_RE_ALL_NUTRIENTS = _build_nutrient_regex()
+
+
+def parse_nutrient_value(value_str: str) -> Optional[float]:
+    """
+    Convert a captured nutrient value (e.g. "12", "0.5", "less than 1") to a
+    float. Values come from the lowercased text.
+    """
+    try:
+        # Handle "less than" cases (e.g., "less than 1g")
+        if "less than" in value_str or "lessthan" in value_str:
+            # Extract the number after "less than" or "lessthan"
+            less_than_match = _RE_LESS_THAN.search(value_str)
+            if less_than_match:
+                return float(less_than_match.group(1))
+            return 0.0
+        return float(value_str)
+    except ValueError:
+        return None
 
 
 def parse_nutrition_text(nutrition_text: str) -> Optional[Dict[str, Any]]:
@@ -28,34 +122,122 @@ def parse_nutrition_text(nutrition_text: str) -> Optional[Dict[str, Any]]:
     
     Returns a dictionary with parsed nutrition values, or None if parsing fails.
     """
+    return parse_nutrition_texts([nutrition_text])[0]
+
+
+# Joins the texts of a batch for the nutrient scan. No nutrient match can span
+# it: it is not whitespace (unlike "\x1e", which \s matches), a digit or a letter
+_BATCH_SEPARATOR = "\x00"
+
+
+# Distinct texts whose parse results are kept per process; the same nutrition
+# text often appears on several SKUs (e.g. sizes of one product)
+PARSE_CACHE_SIZE = 8192
+
+_parse_cache: "OrderedDict[str, Optional[Dict[str, Any]]]" = OrderedDict()
+
+
+def parse_nutrition_texts(nutrition_texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Parse a batch of nutrition texts; the result for each text is the same as
+    parse_nutrition_text's. Results are memoized by text in an LRU cache of
+    PARSE_CACHE_SIZE entries (each caller gets its own copy), and the texts
+    not seen before are parsed together by _parse_uncached.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(nutrition_texts)
+    pending: Dict[str, List[int]] = {}
+    for i, nutrition_text in enumerate(nutrition_texts):
+        if not nutrition_text or not isinstance(nutrition_text, str):
+            continue
+        if nutrition_text in _parse_cache:
+            _parse_cache.move_to_end(nutrition_text)
+            cached = _parse_cache[nutrition_text]
+            results[i] = dict(cached) if cached is not None else None
+        else:
+            pending.setdefault(nutrition_text, []).append(i)
+    
+    if pending:
+        texts = list(pending)
+        for nutrition_text, parsed in zip(texts, _parse_uncached(texts)):
+            _parse_cache[nutrition_text] = parsed
+            for i in pending[nutrition_text]:
+                results[i] = dict(parsed) if parsed is not None else None
+        while len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    
+    return results
+
+
+def _parse_uncached(nutrition_texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Parse a batch of texts. The nutrient pattern runs once over the batch's
+    texts joined by a separator, rather than once per text, and each match is
+    mapped back to its text by offset.
+    """
+    results: List[Optional[Dict[str, Any]]] = []
+    scan_results: List[Dict[str, Any]] = []
+    scan_texts: List[str] = []
+    for nutrition_text in nutrition_texts:
+        parsed = _parse_header(nutrition_text)
+        results.append(parsed)
+        if parsed is not None:
+            result, text_lower = parsed
+            if _BATCH_SEPARATOR in text_lower:
+                _add_nutrients(result, _RE_ALL_NUTRIENTS.finditer(text_lower))
+            else:
+                scan_results.append(result)
+                scan_texts.append(text_lower)
+    
+    if scan_texts:
+        starts = []
+        pos = 0
+        for text_lower in scan_texts:
+            starts.append(pos)
+            pos += len(text_lower) + len(_BATCH_SEPARATOR)
+        matches_by_text: List[list] = [[] for _ in scan_texts]
+        for match in _RE_ALL_NUTRIENTS.finditer(_BATCH_SEPARATOR.join(scan_texts)):
+            matches_by_text[bisect.bisect_right(starts, match.start()) - 1].append(match)
+        for result, matches in zip(scan_results, matches_by_text):
+            _add_nutrients(result, matches)
+    
+    return [parsed[0] if parsed is not None else None for parsed in results]
+
+
+def _parse_header(nutrition_text: str) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    Extract the serving and calories fields. Returns (result, lowercased text)
+    for the nutrient scan, or None when nothing useful can be parsed.
+    """
     if not nutrition_text or not isinstance(nutrition_text, str):
         return None
     
     # Remove the "NOTE: Since posting..." disclaimer at the end
-    note_pattern = r"NOTE:.*$"
-    text = re.sub(note_pattern, "", nutrition_text, flags=re.DOTALL | re.IGNORECASE)
+    text = _RE_NOTE.sub("", nutrition_text)
+    
+    text_lower = text.lower()
+    
+    # Quick reject: without "calories" the calories pattern cannot match, and
+    # nothing is returned without it, so skip the remaining scans
+    if "calories" not in text_lower:
+        return None
     
     result: Dict[str, Any] = {}
     
     # Extract "Serves X" or "Serves about X"
-    serves_match = re.search(r"Serves\s+(?:about\s+)?(\d+)", text, re.IGNORECASE)
+    serves_match = _RE_SERVES.search(text_lower)
     if serves_match:
         result["serving_count"] = int(serves_match.group(1))
     
     # Extract serving size: "serving size" followed by description and optional weight
     # Pattern: "serving size" followed by text, then optional "(XXg" or "(XX g"
     # Note: no space between "size" and the description in some cases
-    serving_size_match = re.search(
-        r"serving\s+size\s*([^(]+)", 
-        text, 
-        re.IGNORECASE
-    )
+    serving_size_match = _RE_SERVING_SIZE.search(text)
     if serving_size_match:
         serving_size_text = serving_size_match.group(1).strip()
         result["serving_size_text"] = serving_size_text
         
         # Try to extract weight in grams from parentheses
-        weight_match = re.search(r"\((\d+(?:\.\d+)?)\s*g", text, re.IGNORECASE)
+        weight_match = _RE_WEIGHT_GRAMS.search(text_lower)
         if weight_match:
             try:
                 result["serving_size_grams"] = float(weight_match.group(1))
@@ -63,122 +245,193 @@ def parse_nutrition_text(nutrition_text: str) -> Optional[Dict[str, Any]]:
                 pass
     
     # Extract calories per serving (note: no space between "serving" and number in some cases)
-    calories_match = re.search(r"calories\s+per\s+serving\s*(\d+)", text, re.IGNORECASE)
+    calories_match = _RE_CALORIES.search(text_lower)
     if calories_match:
         result["calories"] = int(calories_match.group(1))
     
-    # Helper function to extract nutrient values
-    def extract_nutrient(pattern: str, text: str) -> Optional[float]:
-        """Extract a nutrient value (number + unit) from text."""
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                value_str = match.group(1)
-                # Handle "less than" cases (e.g., "less than 1g")
-                if "less than" in value_str.lower() or "lessthan" in value_str.lower():
-                    # Extract the number after "less than" or "lessthan"
-                    less_than_match = re.search(r"(?:less\s*than|lessthan)\s*(\d+(?:\.\d+)?)", value_str, re.IGNORECASE)
-                    if less_than_match:
-                        return float(less_than_match.group(1))
-                    return 0.0
-                return float(value_str)
-            except (ValueError, AttributeError):
-                return None
-        return None
-    
-    # Extract macronutrients (note: no space between nutrient name and number in some cases)
-    # Handle "less than" cases like "less than 1g" or "lessthan1g"
-    result["total_fat_g"] = extract_nutrient(r"Total\s+Fat\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    result["saturated_fat_g"] = extract_nutrient(r"Saturated\s+Fat\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    result["trans_fat_g"] = extract_nutrient(r"Trans\s+Fat\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    result["cholesterol_mg"] = extract_nutrient(r"Cholesterol\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*mg", text)
-    result["sodium_mg"] = extract_nutrient(r"Sodium\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*mg", text)
-    result["total_carbohydrate_g"] = extract_nutrient(r"Total\s+Carbohydrate\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    result["dietary_fiber_g"] = extract_nutrient(r"Dietary\s+Fiber\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    result["total_sugars_g"] = extract_nutrient(r"Total\s+Sugars\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    result["added_sugars_g"] = extract_nutrient(r"Added\s+Sugars\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    result["protein_g"] = extract_nutrient(r"Protein\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*g", text)
-    
-    # Extract vitamins and minerals
-    result["vitamin_d_mcg"] = extract_nutrient(r"Vitamin\s+D\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*mcg", text)
-    result["calcium_mg"] = extract_nutrient(r"Calcium\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*mg", text)
-    result["iron_mg"] = extract_nutrient(r"Iron\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*mg", text)
-    result["potassium_mg"] = extract_nutrient(r"Potassium\s*((?:less\s*than\s*|lessthan\s*)?[\d.]+)\s*mg", text)
-    
     # Only return result if we extracted at least calories (minimum useful data)
     if "calories" in result:
-        return result
+        return result, text_lower
     
     return None
 
 
-def parse_json_file(input_path: str, output_path: Optional[str] = None) -> Dict[str, Any]:
+def _add_nutrients(result: Dict[str, Any], matches) -> None:
+    """
+    Add macronutrients, vitamins and minerals from one text's nutrient matches.
+    Every field is present (None when absent); the first occurrence of each
+    nutrient wins. Handle "less than" cases like "less than 1g" or "lessthan1g"
+    """
+    nutrients: Dict[str, Any] = dict.fromkeys(field for field, _, _ in _NUTRIENTS)
+    found = set()
+    for match in matches:
+        field = match.lastgroup
+        if field not in found:
+            found.add(field)
+            nutrients[field] = parse_nutrient_value(match.group(field))
+    result.update(nutrients)
+
+
+# Items parsed together as one batch and handed to a worker process as one
+# task; large enough to amortize IPC and the per-call regex overhead
+PARSE_CHUNKSIZE = 256
+
+
+def _iter_jobs(items):
+    """Reduce each item to (idx, sku, name, nutrition text) so only those cross to workers."""
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict):
+            yield None
+            continue
+        yield (idx, item.get("sku", f"unknown_{idx}"), item.get("name", "Unknown"), item.get("nutrition"))
+
+
+def _iter_batches(jobs):
+    """Group jobs into lists of up to PARSE_CHUNKSIZE."""
+    batch = []
+    for job in jobs:
+        batch.append(job)
+        if len(batch) == PARSE_CHUNKSIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _parse_batch(jobs):
+    """
+    Parse a batch of items (runs in a worker process). Returns, per job,
+    ("parsed" | "error" | "missing", record), or None for entries that are not
+    objects.
+    """
+    texts = [job[3] if job is not None else None for job in jobs]
+    return [
+        _to_outcome(job, parsed)
+        for job, parsed in zip(jobs, parse_nutrition_texts(texts))
+    ]
+
+
+def _to_outcome(job, parsed):
+    if job is None:
+        return None
+    idx, sku, name, nutrition_text = job
+    
+    if not nutrition_text:
+        return "missing", {"sku": sku, "name": name}
+    
+    if parsed:
+        return "parsed", {
+            "sku": sku,
+            "name": name,
+            "nutrition_parsed": parsed,
+            "nutrition_raw": nutrition_text  # Keep original for reference
+        }
+    return "error", {
+        "sku": sku,
+        "name": name,
+        "nutrition_text": nutrition_text[:200]  # First 200 chars for debugging
+    }
+
+
+def _iter_parsed(input_path: str) -> Iterator[Optional[Tuple[str, Dict[str, Any]]]]:
+    """
+    Yield the outcome (see _parse_batch) for each entry of the input file.
+    Items are decoded one at a time rather than loading the whole file and
+    parsed across worker processes; imap keeps results in input order.
+    """
+    batches = _iter_batches(_iter_jobs(iter_json_array(input_path)))
+    workers = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+    with contextlib.ExitStack() as stack:
+        if workers > 1:
+            pool = stack.enter_context(multiprocessing.Pool(workers))
+            outcomes = pool.imap(_parse_batch, batches)
+        else:
+            outcomes = map(_parse_batch, batches)
+        for batch_outcomes in outcomes:
+            yield from batch_outcomes
+
+
+def parse_json_file(input_path: str, output_path: Optional[str] = None, stream_only: bool = False) -> Dict[str, Any]:
     """
     Parse nutrition data from tj-items.json and create structured output.
     
     Args:
         input_path: Path to input JSON file
         output_path: Optional path to save parsed results. If None, prints summary.
+        stream_only: Keep no records in memory: every record is spilled to disk
+            as it is parsed and the output is assembled from the spill files.
+            Requires output_path.
     
     Returns:
-        Dictionary with parsing statistics and sample results
+        Dictionary with parsing statistics and sample results, or only the
+        summary with stream_only. With output_path set, parse errors are
+        written to "<output_path>.errors.jsonl" as they occur instead of being
+        held in memory, and "parse_errors" iterates over that file.
     """
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if stream_only and not output_path:
+        raise ValueError("stream_only requires an output_path")
     
-    if not isinstance(data, list):
-        raise ValueError("Expected a JSON array at the top level")
+    # Records of a kind with a spill path are appended to that JSON Lines file
+    # (and read back when the output is written) instead of a list. The errors
+    # file is kept; the others are temporary.
+    spill_paths: Dict[str, str] = {}
+    if output_path:
+        spill_paths["error"] = f"{output_path}.errors.jsonl"
+    if stream_only:
+        spill_paths["parsed"] = f"{output_path}.parsed.jsonl.tmp"
+        spill_paths["missing"] = f"{output_path}.missing.jsonl.tmp"
     
-    parsed_items = []
-    parse_errors = []
-    items_without_nutrition = []
+    total_items = 0
+    counts = {"parsed": 0, "error": 0, "missing": 0}
+    kept: Dict[str, List[Dict[str, Any]]] = {"parsed": [], "error": [], "missing": []}
+    with contextlib.ExitStack() as stack:
+        spills = {
+            kind: stack.enter_context(open(path, "w", encoding="utf-8"))
+            for kind, path in spill_paths.items()
+        }
+        for outcome in _iter_parsed(input_path):
+            total_items += 1
+            if outcome is None:
+                continue
+            kind, record = outcome
+            counts[kind] += 1
+            if kind in spills:
+                spills[kind].write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                kept[kind].append(record)
     
-    for idx, item in enumerate(data):
-        if not isinstance(item, dict):
-            continue
-        
-        sku = item.get("sku", f"unknown_{idx}")
-        name = item.get("name", "Unknown")
-        nutrition_text = item.get("nutrition")
-        
-        if not nutrition_text:
-            items_without_nutrition.append({"sku": sku, "name": name})
-            continue
-        
-        parsed = parse_nutrition_text(nutrition_text)
-        
-        if parsed:
-            parsed_items.append({
-                "sku": sku,
-                "name": name,
-                "nutrition_parsed": parsed,
-                "nutrition_raw": nutrition_text  # Keep original for reference
-            })
-        else:
-            parse_errors.append({
-                "sku": sku,
-                "name": name,
-                "nutrition_text": nutrition_text[:200]  # First 200 chars for debugging
-            })
+    def records(kind):
+        return iter_jsonl(spill_paths[kind]) if kind in spill_paths else kept[kind]
     
+    summary = {
+        "total_items": total_items,
+        "items_with_nutrition_text": total_items - counts["missing"],
+        "successfully_parsed": counts["parsed"],
+        "parse_errors": counts["error"],
+        "items_without_nutrition": counts["missing"]
+    }
     result = {
-        "summary": {
-            "total_items": len(data),
-            "items_with_nutrition_text": len(data) - len(items_without_nutrition),
-            "successfully_parsed": len(parsed_items),
-            "parse_errors": len(parse_errors),
-            "items_without_nutrition": len(items_without_nutrition)
-        },
-        "parsed_items": parsed_items,
-        "parse_errors": parse_errors,  # All parse errors included
-        "items_without_nutrition": items_without_nutrition  # All items without nutrition included
+        "summary": summary,
+        "parsed_items": records("parsed"),
+        "parse_errors": records("error"),  # All parse errors included
+        "items_without_nutrition": records("missing")  # All items without nutrition included
     }
     
     if output_path:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
+        try:
+            dump_json(result, output_path)
+        finally:
+            for kind in ("parsed", "missing"):
+                if kind in spill_paths:
+                    os.remove(spill_paths[kind])
         print(f"✅ Parsed nutrition data saved to: {output_path}")
+        if stream_only:
+            return {"summary": summary}
+        result["parse_errors"] = records("error")  # dump_json consumed the first pass
     else:
+        parsed_items = kept["parsed"]
+        parse_errors = kept["error"]
+        
         # Print summary
         print("=" * 60)
         print("NUTRITION PARSING SUMMARY")
@@ -215,7 +468,8 @@ if __name__ == "__main__":
         output_file = sys.argv[2]
     
     try:
-        parse_json_file(input_file, output_file)
+        # Writing a file needs no records in memory, so stream them to disk
+        parse_json_file(input_file, output_file, stream_only=bool(output_file))
     except Exception as e:
         print(f"❌ Error: {e}", file=sys.stderr)
         import traceback
@@ -0,0 +1,46 @@
+"""
+Tests for json_stream.iter_json_array. Run from the scripts directory:
+
+    python3 -m unittest test_json_stream
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from json_stream import iter_json_array
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def read(self, text, chunk_size=4 << 20):
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".json", delete=False) as f:
+            f.write(text)
+        self.addCleanup(os.unlink, f.name)
+        return list(iter_json_array(f.name, chunk_size))
+
+    def test_matches_json_load(self):
+        text = '[1, 2.5, -3e+2, "a,]", {"k": [1, 2]}, null, true, "é"]\n'
+        for chunk_size in (1, 2, 3, 7, 4 << 20):
+            self.assertEqual(self.read(text, chunk_size), json.loads(text))
+
+    def test_empty_array(self):
+        self.assertEqual(self.read("[]"), [])
+        self.assertEqual(self.read(" [ \n ] "), [])
+
+    def test_rejects_bad_separators(self):
+        for text in ("[1,,2]", "[,1]", "[1,]", "[1 2]", "[,]"):
+            for chunk_size in (1, 4 << 20):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        self.read(text, chunk_size)
+
+    def test_rejects_truncated_or_trailing_data(self):
+        for text in ("", "[1, 2", "[1, 2,", '[1, "ab', "[1] x", "{}"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    self.read(text, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,14 @@
 -- Script to verify HNSW indexes are created and working
 -- Run this in your PostgreSQL database
 
--- 1. Check if all three HNSW indexes exist
+-- 1. Check that the HNSW indexes exist
 SELECT 
     schemaname,
     tablename,
     indexname,
     indexdef
 FROM pg_indexes
-WHERE indexname LIKE '%_hnsw'
+WHERE indexname LIKE '%_hnsw%'
 ORDER BY tablename, indexname;
 
 -- 2. Verify the index type is HNSW
@@ -21,7 +21,7 @@ FROM pg_class i
 JOIN pg_am am ON i.relam = am.oid
 JOIN pg_index idx ON i.oid = idx.indexrelid
 JOIN pg_class t ON idx.indrelid = t.oid
-WHERE i.relname LIKE '%_hnsw'
+WHERE i.relname LIKE '%_hnsw%'
 ORDER BY t.relname, i.relname;
 
 -- 3. Check index parameters (HNSW-specific)
@@ -33,21 +33,24 @@ SELECT
 FROM pg_class c
 JOIN pg_index i ON c.oid = i.indexrelid
 JOIN pg_class t ON i.indrelid = t.oid
-WHERE c.relname LIKE '%_hnsw'
+WHERE c.relname LIKE '%_hnsw%'
 ORDER BY t.relname, c.relname;
 
 -- 4. Test a similarity query to verify index usage
 -- This will show if the index is being used (check the execution plan)
 -- Note: Using a sample embedding from the table to test (1536 dimensions)
+-- Mirrors the RAG retrieval query: inner product (<#>, embeddings are unit length)
+-- filtered on the denormalized ie.store_norm, which should pick
+-- idx_item_embeddings_hnsw_ip_trader_joes
 EXPLAIN (ANALYZE, BUFFERS, VERBOSE)
 SELECT 
     i.id,
     i.name,
-    1 - (ie.embedding <=> (SELECT embedding FROM item_embeddings LIMIT 1)) AS similarity
-FROM items i
-JOIN item_embeddings ie ON i.id = ie.item_id
-WHERE i.store = 'TRADER_JOES'
-ORDER BY ie.embedding <=> (SELECT embedding FROM item_embeddings LIMIT 1)
+    -(ie.embedding <#> (SELECT embedding FROM item_embeddings LIMIT 1)) AS similarity
+FROM item_embeddings ie
+JOIN items i ON i.id = ie.item_id
+WHERE ie.store_norm = 'trader_joes'
+ORDER BY ie.embedding <#> (SELECT embedding FROM item_embeddings LIMIT 1)
 LIMIT 10;
 
 -- 5. Check if indexes are being used (look for "Index Scan" or "Index Only Scan" in the plan)